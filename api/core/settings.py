@@ -31,7 +31,87 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'polls.tasks.aggregate_events',
         'schedule': 300.0,
     },
+    'flush-event-buffer-2s': {
+        'task': 'polls.tasks.flush_event_buffer',
+        'schedule': 2.0,
+    },
+    'rollup-votes-30s': {
+        'task': 'polls.tasks.rollup_votes',
+        'schedule': 30.0,
+    },
+    'refresh-rank-scores-1min': {
+        'task': 'polls.tasks.refresh_rank_scores',
+        'schedule': 60.0,
+    },
+    'rebuild-feeds-10min': {
+        'task': 'polls.tasks.rebuild_feeds',
+        'schedule': 600.0,
+    },
+    'flush-view-counts-10s': {
+        'task': 'polls.tasks.flush_view_counts',
+        'schedule': 10.0,
+    },
+    'persist-unique-viewers-1min': {
+        'task': 'polls.tasks.persist_unique_viewers',
+        'schedule': 60.0,
+    },
+    'maintain-event-partitions-1h': {
+        'task': 'polls.tasks.maintain_event_partitions',
+        'schedule': 3600.0,
+    },
+    'drain-vote-stream-2s': {
+        'task': 'polls.tasks.drain_vote_stream',
+        'schedule': 2.0,
+    },
+    'fold-poll-stats-shards-5s': {
+        'task': 'polls.tasks.fold_poll_stats_shards',
+        'schedule': 5.0,
+    },
+    'reconcile-poll-stats-10min': {
+        'task': 'polls.tasks.reconcile_poll_stats',
+        'schedule': 600.0,
+    },
+}
+# Vote ingestion: 'sync' inserts per request; 'stream' queues accepted votes in a Redis Stream
+# that drain_vote_stream bulk-inserts in batches of VOTE_INGEST_BATCH_SIZE.
+VOTE_INGEST_MODE = env('VOTE_INGEST_MODE', default='sync')
+VOTE_INGEST_BATCH_SIZE = env.int('VOTE_INGEST_BATCH_SIZE', default=500)
+# Polls per reconcile_poll_stats run (PollStats vs Vote drift repair)
+POLL_STATS_RECONCILE_BATCH = env.int('POLL_STATS_RECONCILE_BATCH', default=500)
+# Analytics events moved from the Redis buffer into Event per flush batch
+EVENT_BUFFER_FLUSH_BATCH = env.int('EVENT_BUFFER_FLUSH_BATCH', default=1000)
+# Server-side sampling of analytics events: kind -> rate in (0, 1]. A viewer is kept for a poll
+# by a hash of (device, poll) and counts 1/rate times. Votes and shares are never sampled.
+EVENT_SAMPLE_RATES = {
+    'view': env.float('EVENT_SAMPLE_RATE_VIEW', default=1.0),
+    'dwell': env.float('EVENT_SAMPLE_RATE_DWELL', default=1.0),
 }
+# aggregate_events: max new events folded per run, and how old an event must be to be folded
+EVENT_AGG_MAX_EVENTS = env.int('EVENT_AGG_MAX_EVENTS', default=100_000)
+EVENT_AGG_SETTLE_SECONDS = env.int('EVENT_AGG_SETTLE_SECONDS', default=10)
+# Batches per aggregate_events run when behind, and the fold engine: auto | numpy | python
+EVENT_AGG_MAX_BATCHES = env.int('EVENT_AGG_MAX_BATCHES', default=20)
+EVENT_AGG_ENGINE = env('EVENT_AGG_ENGINE', default='auto')
+# rollup_votes: max new votes folded into VoteRollup per run
+VOTE_ROLLUP_MAX_VOTES = env.int('VOTE_ROLLUP_MAX_VOTES', default=100_000)
+# refresh_rank_scores: max polls re-scored per run
+RANK_REFRESH_BATCH = env.int('RANK_REFRESH_BATCH', default=5000)
+# Polls kept in each Redis feed set (hot, per topic); deeper pages are served from SQL
+FEED_ZSET_SIZE = env.int('FEED_ZSET_SIZE', default=1000)
+# Feed sessions: the order of the first FEED_SESSION_SIZE polls is frozen when a client starts paging
+FEED_SESSION_SIZE = env.int('FEED_SESSION_SIZE', default=500)
+# Following timelines: polls kept per user, and the follower count above which an author's
+# polls are merged in at read time instead of fanned out
+TIMELINE_SIZE = env.int('TIMELINE_SIZE', default=500)
+TIMELINE_FANOUT_MAX_FOLLOWERS = env.int('TIMELINE_FANOUT_MAX_FOLLOWERS', default=10_000)
+# Seconds an /author/analytics/ result stays cached per (user, query)
+ANALYTICS_QUERY_CACHE_TTL = env.int('ANALYTICS_QUERY_CACHE_TTL', default=30)
+# Daily Event partitions (PostgreSQL): days created ahead, days of raw events kept
+EVENT_PARTITIONS_AHEAD = env.int('EVENT_PARTITIONS_AHEAD', default=3)
+EVENT_RETENTION_DAYS = env.int('EVENT_RETENTION_DAYS', default=2)
+# Counter rows per poll for vote increments (0 = update PollStats directly). Use on hot polls
+# where voters queue on the PollStats row lock; fold_poll_stats_shards merges them back.
+POLL_STATS_SHARDS = env.int('POLL_STATS_SHARDS', default=0)
 
 # --- Logging ------------------------------------------------------------------
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
@@ -1,6 +1,24 @@
-from rest_framework.pagination import PageNumberPagination, CursorPagination
+import base64
+import binascii
+import json
+import logging
+import math
+import re
+import secrets
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import BooleanField, Expression, F, Value
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param
+
+from lib.redis.pubsub import get_redis
+
+logger = logging.getLogger(__name__)
 
 
 class CommentsPagination(PageNumberPagination):
@@ -22,27 +40,283 @@ class CommentsPagination(PageNumberPagination):
         return super().get_paginated_response(data)
 
 
-class FeedCursorPagination(CursorPagination):
+class _KeysetBefore(Expression):
     """
-    Cursor-based pagination for the feed. Base ordering by created_at; extra ranking is done in queryset.
+    True for rows whose (field1, field2, ...) tuple sorts strictly before `values` in a
+    descending order. PostgreSQL gets a row comparison, which a matching btree index can
+    seek on; other backends get the equivalent OR chain.
+    """
+    output_field = BooleanField()
+
+    def __init__(self, fields, values):
+        super().__init__()
+        self.fields = [F(f) for f in fields]
+        self.values = [Value(v) for v in values]
+
+    def get_source_expressions(self):
+        return [*self.fields, *self.values]
+
+    def set_source_expressions(self, exprs):
+        n = len(exprs) // 2
+        self.fields, self.values = list(exprs[:n]), list(exprs[n:])
+
+    def _compile_all(self, compiler):
+        cols, vals = [], []
+        for field, value in zip(self.fields, self.values):
+            col_sql, col_params = compiler.compile(field)
+            val_sql, val_params = compiler.compile(value)
+            cols.append((col_sql, col_params))
+            vals.append((val_sql, val_params))
+        return cols, vals
+
+    def as_sql(self, compiler, connection):
+        cols, vals = self._compile_all(compiler)
+        sql, params = None, []
+        for (col, cp), (val, vp) in reversed(list(zip(cols, vals))):
+            if sql is None:
+                sql, params = f"{col} < {val}", [*cp, *vp]
+            else:
+                sql = f"({col} < {val} OR ({col} = {val} AND {sql}))"
+                params = [*cp, *vp, *cp, *vp, *params]
+        return sql, params
+
+    def as_postgresql(self, compiler, connection):
+        cols, vals = self._compile_all(compiler)
+        sql = "({}) < ({})".format(", ".join(c for c, _ in cols), ", ".join(v for v, _ in vals))
+        params = [p for _, ps in cols for p in ps] + [p for _, ps in vals for p in ps]
+        return sql, params
+
+
+class FeedCursorPagination(BasePagination):
+    """
+    Pagination for the ranked feed, ordered by (-score, -created_at, -id), stable for a session.
+
+    The first page freezes the order: the keys (id, score) of the top `session_size` rows
+    at that moment are stored in a Redis list, `feeds:session:{token}`, for `session_ttl`
+    seconds, and the page is read from it. The cursor carries the token, the offset of the
+    next page, the snapshot time of the first page and the last row's (score, created_at, id).
+    Later pages read their ids from the stored list and hydrate them in one `id__in` query, so
+    scores refreshed while the session pages cannot skip or repeat items. Polls that left the
+    feed since (hidden, deleted) are dropped from their page.
+
+    Past the end of a session list, when the list expired, or without Redis, pages seek past
+    the cursor key (WHERE (score, created_at, id) < key, an index range scan for the
+    anonymous feed) on live scores, leaving out polls created after the snapshot. There,
+    a re-scored poll can still cross the cursor between two pages.
+    An invalid cursor gives an empty page.
     """
     page_size = 10
-    ordering = "-created_at"
+    ordering = ("-score", "-created_at", "-id")
+    datetime_fields = ("created_at",)
+    snapshot_field = "created_at"
     cursor_query_param = "cursor"
+    session_key_fmt = "feeds:session:{token}"
+    session_ttl = 60 * 60
+
+    @property
+    def session_size(self) -> int:
+        return getattr(settings, "FEED_SESSION_SIZE", 500)
+
+    def _fields(self):
+        return [o.lstrip("-") for o in self.ordering]
+
+    def encode_cursor(self, position, snapshot, session=None) -> str:
+        values = [v.isoformat() if isinstance(v, datetime) else v for v in position]
+        data = {"p": values, "t": snapshot.isoformat()}
+        if session is not None:
+            data["s"], data["o"] = session
+        raw = json.dumps(data, separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+    def decode_cursor(self, encoded: str):
+        """(position, snapshot, (token, offset) or None); raises ValueError for a malformed cursor."""
+        data = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+        if not isinstance(data, dict):
+            raise ValueError("cursor is not an object")
+        fields, values = self._fields(), data["p"]
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise ValueError("cursor does not match the feed ordering")
+        position = [self._check_value(name, v) for name, v in zip(fields, values)]
+        if not isinstance(data["t"], str):
+            raise ValueError("invalid cursor snapshot")
+        session = None
+        if "s" in data:
+            token, offset = data["s"], data.get("o")
+            if not (isinstance(token, str) and _TOKEN_RE.match(token)) or not _is_int(offset) or offset < 0:
+                raise ValueError("invalid cursor session")
+            session = (token, offset)
+        return position, _parse_aware(data["t"]), session
+
+    def _check_value(self, name: str, value):
+        if name in self.datetime_fields:
+            if not isinstance(value, str):
+                raise ValueError(f"invalid cursor {name}")
+            return _parse_aware(value)
+        if name == "score":
+            if not (_is_int(value) or isinstance(value, float)) or not math.isfinite(value):
+                raise ValueError("invalid cursor score")
+            return float(value)
+        if not _is_int(value):
+            raise ValueError(f"invalid cursor {name}")
+        return value
+
+    def fetch_queryset(self, queryset, position, snapshot, limit):
+        """Up to `limit` rows of `queryset` after the keyset `position`, created by `snapshot`."""
+        queryset = queryset.filter(**{f"{self.snapshot_field}__lte": snapshot})
+        if position is not None:
+            queryset = queryset.filter(_KeysetBefore(self._fields(), position))
+        return list(queryset.order_by(*self.ordering)[:limit])
+
+    def list_queryset_keys(self, queryset, snapshot, limit):
+        """(id, score) of the first `limit` rows of `queryset` in feed order, created by `snapshot`."""
+        queryset = queryset.filter(**{f"{self.snapshot_field}__lte": snapshot})
+        queryset = queryset.select_related(None).prefetch_related(None).order_by(*self.ordering)
+        return list(queryset.values_list("id", "score")[:limit])
 
     def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_keyset(
+            lambda position, snapshot, limit: self.fetch_queryset(queryset, position, snapshot, limit),
+            request,
+            queryset=queryset,
+        )
+
+    def paginate_keyset(self, fetch, request, queryset=None, list_keys=None):
+        """
+        Paginate with a custom row source: `fetch(position, snapshot, limit)` returns up to
+        `limit` objects in feed order after `position` (None on the first page).
+
+        With `queryset`, sessions are frozen (see the class docstring): `list_keys(snapshot,
+        limit)` lists the (id, score) keys of the first page onwards (default: from SQL, see
+        list_queryset_keys; it may return None to fall back to that), and session pages are
+        hydrated from `queryset`.
+        """
+        self.request = request
+        self.next_cursor = None
+        self._empty = False
+        encoded = request.query_params.get(self.cursor_query_param)
+        position, session, self.snapshot = None, None, timezone.now()
+        if encoded:
+            try:
+                position, self.snapshot, session = self.decode_cursor(encoded)
+            except (ValueError, TypeError, KeyError, binascii.Error):
+                self._empty = True
+                return []
+
+        if queryset is not None and self.session_size > 0:
+            r = get_redis()
+            if r is not None:
+                if encoded is None:
+                    rows = self._start_session(r, queryset, list_keys)
+                    if rows is not None:
+                        return rows
+                elif session is not None:
+                    rows = self._session_page(r, queryset, session, position)
+                    if rows is not None:
+                        return rows
+
+        rows = fetch(position, self.snapshot, self.page_size + 1)
+        if len(rows) > self.page_size:
+            rows = rows[: self.page_size]
+            last = rows[-1]
+            self.next_cursor = self.encode_cursor([getattr(last, f) for f in self._fields()], self.snapshot)
+        return rows
+
+    def _start_session(self, r, queryset, list_keys):
+        keys = list_keys(self.snapshot, self.session_size) if list_keys is not None else None
+        if keys is None:
+            keys = self.list_queryset_keys(queryset, self.snapshot, self.session_size)
+        token = secrets.token_urlsafe(12)
+        if len(keys) > self.page_size:
+            key = self.session_key_fmt.format(token=token)
+            try:
+                pipe = r.pipeline(transaction=True)
+                pipe.rpush(key, *[f"{pid}:{score!r}" for pid, score in keys])
+                pipe.expire(key, self.session_ttl)
+                pipe.execute()
+            except Exception:
+                logger.warning("feed session: write failed; paging on live scores")
+                return None
+        truncated = len(keys) >= self.session_size
+        return self._serve(queryset, keys[: self.page_size], token, 0, len(keys), truncated)
+
+    def _session_page(self, r, queryset, session, position):
+        token, offset = session
+        key = self.session_key_fmt.format(token=token)
         try:
-            return super().paginate_queryset(queryset, request, view)
-        except NotFound:
-            # Invalid/expired cursor → empty slice
-            self.has_next = False
-            self.has_previous = False
-            self.next_cursor = None
-            self.previous_cursor = None
-            self._empty = True
-            return []
+            pipe = r.pipeline(transaction=False)
+            pipe.lrange(key, offset, offset + self.page_size - 1)
+            pipe.llen(key)
+            raw, length = pipe.execute()
+        except Exception:
+            logger.warning("feed session: read failed; paging on live scores")
+            return None
+        if not length:
+            # Expired: continue from the cursor key on live scores.
+            return None
+        if not raw:
+            if length < self.session_size:
+                # End of a complete session list: end of the feed.
+                return []
+            return None
+        keys = []
+        for item in raw:
+            pid, score = _decode(item).split(":", 1)
+            keys.append((int(pid), float(score)))
+        return self._serve(queryset, keys, token, offset, length, length >= self.session_size, position)
+
+    def _serve(self, queryset, keys, token, offset, length, truncated, position=None):
+        """Hydrate session `keys` in order and set the next cursor."""
+        polls = {p.pk: p for p in queryset.filter(pk__in=[pid for pid, _ in keys])}
+        rows = []
+        for pid, score in keys:
+            poll = polls.get(pid)
+            if poll is not None:
+                poll.score = score
+                rows.append(poll)
+        next_offset = offset + len(keys)
+        if next_offset < length or truncated:
+            if rows:
+                last = rows[-1]
+                position = [last.score, last.created_at, last.pk]
+            elif position is None:
+                pid, score = keys[-1]
+                position = [score, self.snapshot, pid]
+            self.next_cursor = self.encode_cursor(position, self.snapshot, session=(token, next_offset))
+        return rows
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
 
     def get_paginated_response(self, data):
-        if getattr(self, "_empty", False):
+        if self._empty:
             return Response({"next": None, "previous": None, "results": []})
-        return super().get_paginated_response(data)
+        # Forward-only: a feed session restarts from the top instead of paging back.
+        return Response({"next": self.get_next_link(), "previous": None, "results": data})
+
+
+class FollowingCursorPagination(FeedCursorPagination):
+    """Keyset pagination for the following timeline: newest first by id, an order that never moves."""
+    page_size = 20
+    ordering = ("-id",)
+    datetime_fields = ()
+    session_size = 0
+
+
+_TOKEN_RE = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _decode(value) -> str:
+    return value.decode("utf-8") if isinstance(value, (bytes, bytearray)) else value
+
+
+def _parse_aware(value: str) -> datetime:
+    dt = parse_datetime(value)
+    if dt is None or dt.tzinfo is None:
+        raise ValueError("invalid cursor timestamp")
+    return dt
@@ -0,0 +1,11 @@
+from __future__ import annotations
+
+from rest_framework.parsers import JSONParser
+
+
+class PlainTextJSONParser(JSONParser):
+    """
+    JSON sent as text/plain — what navigator.sendBeacon() uses for string payloads,
+    since it cannot set an application/json content type without a CORS preflight.
+    """
+    media_type = "text/plain"
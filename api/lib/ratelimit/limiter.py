@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import Optional, Tuple
+
+from lib.redis.pubsub import get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_FMT = "rl:{policy}:{scope}:{ident}:{bucket}"
+
+# Sliding-window counter: the previous fixed window is weighted by how much of it still
+# overlaps the sliding window, so there is no burst at window boundaries.
+# KEYS: (current, previous) bucket key per rule; ARGV: cost, then (limit, window_ms, elapsed_ms)
+# per rule. All rules are checked before any counter is incremented. Returns the 1-based index
+# of the first exceeded rule, or 0 if the hit was allowed and counted.
+_SLIDING_WINDOW_LUA = """
+local n = #KEYS / 2
+local cost = tonumber(ARGV[1])
+for i = 1, n do
+  local limit = tonumber(ARGV[3 * i - 1])
+  local window = tonumber(ARGV[3 * i])
+  local elapsed = tonumber(ARGV[3 * i + 1])
+  local cur = tonumber(redis.call('GET', KEYS[2 * i - 1]) or '0')
+  local prev = tonumber(redis.call('GET', KEYS[2 * i]) or '0')
+  if prev * (window - elapsed) / window + cur + cost > limit then
+    return i
+  end
+end
+for i = 1, n do
+  redis.call('INCRBY', KEYS[2 * i - 1], cost)
+  redis.call('PEXPIRE', KEYS[2 * i - 1], tonumber(ARGV[3 * i]) * 2)
+end
+return 0
+"""
+
+_script = None
+
+
+class RatePolicy:
+    """
+    Named set of rate limit rules for one endpoint, e.g.:
+
+        VOTE_RATE_POLICY = RatePolicy("vote", ip=(60, 60), dev=(60, 60))
+        exceeded = VOTE_RATE_POLICY.check(ip=ip_hash, dev=device_hash)
+
+    Each rule is `scope=(limit, window_seconds)`. `check` evaluates every rule whose identity
+    is provided in a single Redis round trip (one EVALSHA) and returns the scope of the first
+    exceeded rule, or None when the request is allowed. `cost` counts one call as several
+    hits (e.g. a batch of votes).
+    """
+
+    def __init__(self, name: str, **rules: Tuple[int, int]):
+        self.name = name
+        self.rules = rules
+
+    def window(self, scope: str) -> int:
+        return self.rules[scope][1]
+
+    def check(self, cost: int = 1, **identities: Optional[str]) -> Optional[str]:
+        global _script
+        now_ms = int(time.time() * 1000)
+        scopes, keys, args = [], [], [cost]
+        for scope, (limit, window) in self.rules.items():
+            ident = identities.get(scope)
+            if not ident:
+                continue
+            window_ms = window * 1000
+            bucket = now_ms // window_ms
+            keys += [
+                KEY_FMT.format(policy=self.name, scope=scope, ident=ident, bucket=bucket),
+                KEY_FMT.format(policy=self.name, scope=scope, ident=ident, bucket=bucket - 1),
+            ]
+            args += [limit, window_ms, now_ms - bucket * window_ms]
+            scopes.append(scope)
+        if not scopes:
+            return None
+
+        r = get_redis()
+        if r is None:
+            return None
+        try:
+            if _script is None:
+                _script = r.register_script(_SLIDING_WINDOW_LUA)
+            exceeded = int(_script(keys=keys, args=args))
+        except Exception:
+            # Fail open: a Redis outage should not take the endpoints down with it.
+            logger.warning("rate limit check failed for policy=%s; allowing", self.name)
+            return None
+        return scopes[exceeded - 1] if exceeded else None
@@ -0,0 +1,33 @@
+from rest_framework.throttling import BaseThrottle
+
+from lib.ratelimit.limiter import RatePolicy
+from lib.utils.network import get_client_ip, sha256_hex
+
+# Identity of requests whose identity is empty (e.g. no client IP): they share one bucket.
+SHARED_IDENTITY = "unknown"
+
+
+class PolicyThrottle(BaseThrottle):
+    """
+    DRF throttle backed by a RatePolicy (shared Redis sliding-window limiter).
+
+    Subclasses set `policy`. By default authenticated requests are identified by the
+    `user` scope and anonymous ones by the `anon` scope (hashed client IP). An empty
+    identity is counted in a shared bucket instead of skipping the limit.
+    """
+    policy: RatePolicy = None
+
+    def get_identities(self, request, view) -> dict:
+        user = getattr(request, "user", None)
+        if user and user.is_authenticated:
+            return {"user": str(user.pk)}
+        return {"anon": sha256_hex(get_client_ip(request))}
+
+    def allow_request(self, request, view) -> bool:
+        identities = {scope: ident or SHARED_IDENTITY for scope, ident in self.get_identities(request, view).items()}
+        self._exceeded = self.policy.check(**identities)
+        return self._exceeded is None
+
+    def wait(self):
+        exceeded = getattr(self, "_exceeded", None)
+        return self.policy.window(exceeded) if exceeded else None
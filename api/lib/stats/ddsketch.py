@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import math
+from typing import Dict, Iterable, Optional
+
+
+class DDSketch:
+    """
+    Mergeable quantile sketch for non-negative values (DDSketch, Masson et al. 2019).
+
+    Values are counted in logarithmic buckets so every quantile is returned within
+    `relative_accuracy` of the true value; two sketches with the same accuracy merge
+    exactly by adding bucket counts. Memory is bounded by `max_buckets`: past it the
+    lowest buckets are collapsed, which only affects the smallest quantiles.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def _index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def add(self, value: float, weight: int = 1) -> None:
+        if value < 0:
+            raise ValueError("DDSketch only accepts non-negative values")
+        if value == 0:
+            self.zero_count += weight
+        else:
+            i = self._index(value)
+            self.bins[i] = self.bins.get(i, 0) + weight
+            self._collapse()
+        self.count += weight
+
+    def index(self, value: float) -> int:
+        """Bucket index of a positive value (for callers that bin values in bulk, see add_bins)."""
+        return self._index(value)
+
+    def add_bins(self, bins: Dict[int, int], zero_count: int = 0) -> None:
+        """Add pre-binned counts {bucket index: count} plus `zero_count` zero values."""
+        for i, c in bins.items():
+            self.bins[i] = self.bins.get(i, 0) + c
+        self.zero_count += zero_count
+        self.count += zero_count + sum(bins.values())
+        self._collapse()
+
+    def extend(self, values: Iterable[float]) -> None:
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "DDSketch") -> None:
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("cannot merge sketches with different relative accuracy")
+        for i, c in other.bins.items():
+            self.bins[i] = self.bins.get(i, 0) + c
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self._collapse()
+
+    def _collapse(self) -> None:
+        if len(self.bins) <= self.max_buckets:
+            return
+        keys = sorted(self.bins)
+        excess = keys[: len(keys) - self.max_buckets + 1]
+        self.bins[excess[-1]] = sum(self.bins.pop(i) for i in excess[:-1]) + self.bins[excess[-1]]
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Value at quantile q in [0, 1], or None for an empty sketch."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for i in sorted(self.bins):
+            seen += self.bins[i]
+            if seen > rank:
+                return 2 * self.gamma ** i / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_dict(self) -> dict:
+        """Compact JSON-serializable form: {"a": accuracy, "z": zero count, "b": {index: count}}."""
+        return {
+            "a": self.relative_accuracy,
+            "z": self.zero_count,
+            "b": {str(i): c for i, c in self.bins.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict], relative_accuracy: float = 0.01) -> "DDSketch":
+        """Rebuild a sketch from `to_dict` output; an empty/None value gives an empty sketch."""
+        if not data:
+            return cls(relative_accuracy)
+        sketch = cls(data.get("a", relative_accuracy))
+        sketch.zero_count = int(data.get("z", 0))
+        sketch.bins = {int(i): int(c) for i, c in (data.get("b") or {}).items()}
+        sketch.count = sketch.zero_count + sum(sketch.bins.values())
+        return sketch
@@ -0,0 +1,130 @@
+# polls/analytics_query.py
+"""
+Analytics time-series queries answered from rollup tables only.
+
+Metrics come from PollMetricRollup (views, shares, dwell) and VoteRollup (votes);
+raw Event rows are never read. Hour and day buckets are read as stored; week and
+month are downsampled from day buckets on the fly. Results are cached per
+(user, query) for ANALYTICS_QUERY_CACHE_TTL seconds.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Dict, List, Sequence
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+
+from polls.models import PollMetricRollup, VoteRollup
+from polls.rollups import bucket_start
+
+METRICS = ("views", "votes", "shares", "dwell_count", "dwell_ms_avg")
+# Requested granularity -> stored rollup level it is read from
+SOURCE_LEVEL = {"hour": "hour", "day": "day", "week": "day", "month": "day"}
+MAX_POINTS = 1000
+CACHE_KEY_FMT = "analytics:q:{user_id}:{digest}"
+
+
+class QueryError(ValueError):
+    """Invalid query parameters."""
+
+
+def bucket_starts(start: datetime, end: datetime, granularity: str) -> List[datetime]:
+    """Starts of the buckets overlapping [start, end)."""
+    out = []
+    t = bucket_start(start, granularity)
+    while t < end:
+        out.append(t)
+        if len(out) > MAX_POINTS:
+            raise QueryError(f"too many points; at most {MAX_POINTS} buckets per series")
+        if granularity == "month":
+            t = t.replace(year=t.year + t.month // 12, month=t.month % 12 + 1)
+        else:
+            t += {"hour": timedelta(hours=1), "day": timedelta(days=1), "week": timedelta(weeks=1)}[granularity]
+    return out
+
+
+def run_query(
+    poll_ids: Sequence[int],
+    metrics: Sequence[str],
+    start: datetime,
+    end: datetime,
+    granularity: str,
+) -> List[Dict]:
+    """
+    [{"poll_id", "metric", "points": [[bucket_start, value], ...]}] for every poll and metric,
+    with empty buckets as 0 (dwell_ms_avg: None).
+    """
+    if granularity not in SOURCE_LEVEL:
+        raise QueryError(f"`granularity` must be one of {', '.join(SOURCE_LEVEL)}")
+    unknown = set(metrics) - set(METRICS)
+    if unknown or not metrics:
+        raise QueryError(f"`metrics` must be a subset of {', '.join(METRICS)}")
+    if start >= end:
+        raise QueryError("`from` must be before `to`")
+    buckets = bucket_starts(start, end, granularity)
+    level = SOURCE_LEVEL[granularity]
+    lo = bucket_start(start, granularity)
+
+    stored = set()
+    for m in metrics:
+        if m == "dwell_ms_avg":
+            stored |= {"dwell_count", "dwell_ms_sum"}
+        elif m != "votes":
+            stored.add(m)
+
+    values: Dict[tuple, int] = {}
+    if stored:
+        rows = PollMetricRollup.objects.filter(
+            poll_id__in=poll_ids, metric__in=stored, granularity=level, bucket_start__gte=lo, bucket_start__lt=end
+        ).values_list("poll_id", "metric", "bucket_start", "value")
+        for pid, metric, t, v in rows:
+            key = (pid, metric, bucket_start(t, granularity))
+            values[key] = values.get(key, 0) + v
+    if "votes" in metrics:
+        rows = (
+            VoteRollup.objects.filter(
+                poll_id__in=poll_ids, granularity=level, bucket_start__gte=lo, bucket_start__lt=end
+            )
+            .values("poll_id", "bucket_start")
+            .annotate(n=Sum("count"))
+            .order_by()
+        )
+        for row in rows:
+            key = (row["poll_id"], "votes", bucket_start(row["bucket_start"], granularity))
+            values[key] = values.get(key, 0) + row["n"]
+
+    series = []
+    for pid in poll_ids:
+        for metric in metrics:
+            if metric == "dwell_ms_avg":
+                points = []
+                for t in buckets:
+                    n = values.get((pid, "dwell_count", t), 0)
+                    points.append([t, round(values.get((pid, "dwell_ms_sum", t), 0) / n) if n else None])
+            else:
+                points = [[t, values.get((pid, metric, t), 0)] for t in buckets]
+            series.append({"poll_id": pid, "metric": metric, "points": points})
+    return series
+
+
+def cached_query(user_id: int, poll_ids, metrics, start, end, granularity) -> List[Dict]:
+    """`run_query` behind a short-lived cache entry keyed by user and normalized query."""
+    metrics = sorted(set(metrics))
+    query = {
+        "p": sorted(poll_ids),
+        "m": metrics,
+        "f": start.isoformat(),
+        "t": end.isoformat(),
+        "g": granularity,
+    }
+    digest = hashlib.sha1(json.dumps(query, sort_keys=True).encode("utf-8")).hexdigest()
+    key = CACHE_KEY_FMT.format(user_id=user_id, digest=digest)
+    series = cache.get(key)
+    if series is None:
+        series = run_query(sorted(poll_ids), metrics, start, end, granularity)
+        cache.set(key, series, timeout=getattr(settings, "ANALYTICS_QUERY_CACHE_TTL", 30))
+    return series
@@ -0,0 +1,189 @@
+# polls/counters.py
+"""
+Redis-backed per-poll vote counters.
+
+Each poll has one hash `polls:counts:{poll_id}` with a field per option id
+plus a `total` field. Increments are applied atomically after the vote
+transaction commits; a missing key is rebuilt from the Vote table on read.
+
+A rebuild reads the DB and fills the hash later, so a vote that commits in
+between would be missing from the fill while its increment found no key. Each
+poll therefore has a generation counter, `polls:counts:{poll_id}:gen`, that an
+increment on a missing key (and `invalidate`) bumps; a fill whose generation
+changed since its DB read is discarded and the next read rebuilds again.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Dict, Tuple
+
+from django.db.models import Count
+
+from polls.models import Vote
+from lib.redis.pubsub import get_redis
+
+logger = logging.getLogger(__name__)
+
+COUNTS_KEY_FMT = "polls:counts:{poll_id}"
+GEN_KEY_FMT = "polls:counts:{poll_id}:gen"
+TOTAL_FIELD = "total"
+# Keys expire so that any drift (e.g. increments lost while the key was missing) self-heals.
+COUNTS_TTL = 60 * 60 * 24
+
+# Increment only when the hash exists: a missing key is rebuilt from the DB on the next read,
+# and a partial hash created by a blind HINCRBY would otherwise be taken for the full state.
+# A miss bumps the generation so an in-flight rebuild that did not see this vote is discarded.
+# KEYS: hash, generation; ARGV: option_id, amount, ttl
+_INCR_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+  redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+  redis.call('HINCRBY', KEYS[1], 'total', ARGV[2])
+  return 1
+end
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return 0
+"""
+
+# Fill the hash from a DB snapshot unless a concurrent reader already did, or the generation
+# moved since the snapshot was read. KEYS: hash, generation; ARGV: ttl, generation, field, value...
+_FILL_LUA = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[2] then
+  return 0
+end
+if redis.call('EXISTS', KEYS[1]) == 0 then
+  redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+  redis.call('EXPIRE', KEYS[1], ARGV[1])
+  return 1
+end
+return 0
+"""
+
+_scripts: dict = {}
+
+
+def _script(r, name: str, source: str):
+    """Return a registered Lua script (EVALSHA with automatic EVAL fallback)."""
+    script = _scripts.get(name)
+    if script is None:
+        script = _scripts[name] = r.register_script(source)
+    return script
+
+
+def counts_key(poll_id: int) -> str:
+    return COUNTS_KEY_FMT.format(poll_id=poll_id)
+
+
+def gen_key(poll_id: int) -> str:
+    return GEN_KEY_FMT.format(poll_id=poll_id)
+
+
+def _counts_from_db(poll_id: int) -> Dict[int, int]:
+    agg = Vote.objects.filter(poll_id=poll_id).values("option_id").annotate(c=Count("id"))
+    return {row["option_id"]: row["c"] for row in agg}
+
+
+def _decode(raw: dict) -> Tuple[Dict[int, int], int]:
+    counts: Dict[int, int] = {}
+    total = 0
+    for k, v in raw.items():
+        field = k.decode("utf-8") if isinstance(k, (bytes, bytearray)) else str(k)
+        if field == TOTAL_FIELD:
+            total = int(v)
+        else:
+            counts[int(field)] = int(v)
+    return counts, total
+
+
+def rebuild(poll_id: int) -> Tuple[Dict[int, int], int]:
+    """
+    Recompute counts from the Vote table and store them in Redis (if the key is still missing
+    and no vote missed the key since the DB read).
+    """
+    r = get_redis()
+    gen = None
+    if r is not None:
+        try:
+            gen = r.get(gen_key(poll_id)) or b"0"
+        except Exception:
+            logger.warning("vote counters: generation read failed for poll_id=%s", poll_id)
+    counts = _counts_from_db(poll_id)
+    total = sum(counts.values())
+    if gen is not None:
+        args = [COUNTS_TTL, gen, TOTAL_FIELD, total]
+        for option_id, c in counts.items():
+            args += [option_id, c]
+        try:
+            _script(r, "fill", _FILL_LUA)(keys=[counts_key(poll_id), gen_key(poll_id)], args=args)
+        except Exception:
+            logger.warning("vote counters: fill failed for poll_id=%s", poll_id)
+    return counts, total
+
+
+def get_counts(poll_id: int) -> Tuple[Dict[int, int], int]:
+    """
+    Return ({option_id: count}, total) for a poll.
+    Reads the Redis hash; falls back to the Vote table when the key is missing or Redis is down.
+    """
+    r = get_redis()
+    if r is not None:
+        try:
+            raw = r.hgetall(counts_key(poll_id))
+        except Exception:
+            logger.warning("vote counters: read failed for poll_id=%s; using DB", poll_id)
+            raw = None
+        if raw:
+            return _decode(raw)
+    return rebuild(poll_id)
+
+
+def incr(poll_id: int, option_id: int, amount: int = 1) -> bool:
+    """
+    Atomically add `amount` to an option counter and the total.
+    Returns False when the key is missing (it will be rebuilt lazily) or Redis failed.
+    """
+    r = get_redis()
+    if r is None:
+        return False
+    try:
+        return bool(
+            _script(r, "incr", _INCR_LUA)(
+                keys=[counts_key(poll_id), gen_key(poll_id)], args=[option_id, amount, COUNTS_TTL]
+            )
+        )
+    except Exception:
+        logger.warning("vote counters: incr failed for poll_id=%s; invalidating", poll_id)
+        invalidate(poll_id)
+        return False
+
+
+def invalidate(poll_id: int) -> None:
+    """Drop the cached counters so the next read rebuilds them from the DB (and no older fill lands)."""
+    r = get_redis()
+    if r is None:
+        return
+    try:
+        pipe = r.pipeline(transaction=True)
+        pipe.delete(counts_key(poll_id))
+        pipe.incr(gen_key(poll_id))
+        pipe.expire(gen_key(poll_id), COUNTS_TTL)
+        pipe.execute()
+    except Exception:
+        logger.warning("vote counters: invalidate failed for poll_id=%s", poll_id)
+
+
+def percents_for(counts: Dict[int, int], total: int) -> Dict[int, float]:
+    return {opt: round((c / total) * 100, 2) if total else 0.0 for opt, c in counts.items()}
+
+
+def snapshot(poll_id: int) -> dict:
+    """
+    Vote snapshot in the SSE/update payload shape: poll_id, total_votes, counts, percents.
+    """
+    counts, total = get_counts(poll_id)
+    return {
+        "poll_id": poll_id,
+        "total_votes": total,
+        "counts": counts,
+        "percents": percents_for(counts, total),
+    }
@@ -0,0 +1,131 @@
+# polls/event_buffer.py
+"""
+Buffered analytics event ingestion.
+
+Collected events are appended to a Redis list and bulk-inserted into Event by
+`flush` (Celery beat), so a burst of dwell events costs one RPUSH per request
+instead of a Poll lookup and an INSERT per event. Poll ids are checked against
+a per-worker cache of known polls, which also resolves each event's `author`
+(the poll's author; collection is unauthenticated). Views are not stored as events at all; they
+are counted in Redis by polls/view_counts.py.
+"""
+from __future__ import annotations
+
+import json
+import logging
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, transaction
+
+from polls.models import Event, Poll
+from lib.cache.ttl_lru import TTLLRUCache
+from lib.redis.pubsub import get_redis
+
+logger = logging.getLogger(__name__)
+
+EVENT_BUFFER_KEY = "analytics:events:buffer"
+KNOWN_POLLS_TTL = 60
+KNOWN_POLLS_MAXSIZE = 50_000
+
+_known_polls = TTLLRUCache(maxsize=KNOWN_POLLS_MAXSIZE, ttl=KNOWN_POLLS_TTL)
+
+
+def poll_authors(poll_ids: Iterable[int]) -> dict:
+    """Return {poll_id: author_id} for the `poll_ids` that exist; cache misses are checked in one query."""
+    ids = set(poll_ids)
+    known = {}
+    for pid in ids:
+        author_id = _known_polls.get(pid)
+        if author_id is not None:
+            known[pid] = author_id
+    missing = ids - known.keys()
+    if missing:
+        for pid, author_id in Poll.objects.filter(pk__in=missing).values_list("id", "author_id"):
+            _known_polls.set(pid, author_id)
+            known[pid] = author_id
+    return known
+
+
+def enqueue(events: list[dict]) -> None:
+    """
+    Buffer events (dicts with kind, poll_id, author_id, device_id, dwell_ms, weight).
+    Falls back to a direct bulk insert when Redis is unavailable.
+    """
+    if not events:
+        return
+    r = get_redis()
+    if r is not None:
+        try:
+            r.rpush(EVENT_BUFFER_KEY, *[json.dumps(e, separators=(",", ":")) for e in events])
+            return
+        except Exception:
+            logger.warning("event buffer: push failed; inserting %d events directly", len(events))
+    insert(events)
+
+
+def insert(events: list[dict]) -> int:
+    """Bulk-insert events, dropping those of polls deleted since they were collected."""
+    alive = set(Poll.objects.filter(pk__in={e["poll_id"] for e in events}).values_list("id", flat=True))
+    events = [e for e in events if e["poll_id"] in alive]
+    rows = [
+        Event(
+            kind=e["kind"],
+            poll_id=e["poll_id"],
+            author_id=e.get("author_id"),
+            device_id=e.get("device_id") or "",
+            dwell_ms=e.get("dwell_ms") or 0,
+            weight=e.get("weight", 1),
+        )
+        for e in events
+    ]
+    Event.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def _insert_each(events: list[dict]) -> int:
+    """Insert events one at a time, dropping those the database rejects."""
+    inserted = 0
+    for e in events:
+        try:
+            with transaction.atomic():
+                inserted += insert([e])
+        except (DataError, IntegrityError):
+            logger.warning("event buffer: dropping rejected event %s", e)
+    return inserted
+
+
+def flush(batch_size: Optional[int] = None, max_batches: int = 20) -> int:
+    """
+    Move buffered events into the Event table in batches of EVENT_BUFFER_FLUSH_BATCH.
+    A batch the database rejects is retried row by row and the bad rows are dropped; a batch
+    that fails for other reasons (database down) is pushed back for the next run.
+    Returns the number of inserted rows.
+    """
+    batch_size = batch_size or getattr(settings, "EVENT_BUFFER_FLUSH_BATCH", 1000)
+    r = get_redis()
+    if r is None:
+        return 0
+    inserted = 0
+    for _ in range(max_batches):
+        raw = r.lpop(EVENT_BUFFER_KEY, batch_size)
+        if not raw:
+            break
+        events = []
+        for item in raw:
+            try:
+                events.append(json.loads(item))
+            except ValueError:
+                logger.warning("event buffer: dropping malformed entry")
+        try:
+            with transaction.atomic():
+                inserted += insert(events)
+        except (DataError, IntegrityError):
+            # A bad row (e.g. out-of-range value) must not block the buffer: insert one by one.
+            inserted += _insert_each(events)
+        except Exception:
+            r.rpush(EVENT_BUFFER_KEY, *raw)
+            raise
+        if len(raw) < batch_size:
+            break
+    return inserted
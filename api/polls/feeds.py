@@ -0,0 +1,219 @@
+# polls/feeds.py
+"""
+Ranked feeds in Redis sorted sets.
+
+`feeds:hot` holds the top FEED_ZSET_SIZE public polls by Poll.rank_score and
+`feeds:topic:{topic_id}` the top polls of each topic. Scores are written by
+ranking.refresh (new polls, vote changes, freshness decay) and by the Poll
+save/delete signal (moderation, edits); `rebuild` (rebuild_feeds task)
+recreates every set from SQL so drift and missed updates heal.
+
+A key that does not exist has not been built yet: incremental updates never
+create keys, so a present key always holds the complete top N. Keys that were
+cut to FEED_ZSET_SIZE are flagged in `feeds:truncated`; paging past their end
+falls back to SQL.
+
+`session_keys` lists the top of a set to freeze a feed session (see
+FeedCursorPagination); `fetch` serves a page of the keyset feed from a set:
+ZREVRANGEBYSCORE from the cursor score, then one `id__in` query to hydrate the
+polls. It returns None whenever the set cannot answer exactly, and the caller
+uses SQL instead.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+from polls.models import Poll, PollTopic, Topic, VisibilityMode
+from lib.redis.pubsub import get_redis
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_KEY = "feeds:hot"
+TOPIC_KEY_FMT = "feeds:topic:{topic_id}"
+TRUNCATED_KEY = "feeds:truncated"
+
+
+def topic_key(topic_id: int) -> str:
+    return TOPIC_KEY_FMT.format(topic_id=topic_id)
+
+
+def feed_size() -> int:
+    return getattr(settings, "FEED_ZSET_SIZE", 1000)
+
+
+def feed_polls():
+    """Polls that belong in the public feeds."""
+    return Poll.objects.filter(visibility=VisibilityMode.PUBLIC, is_hidden=False)
+
+
+def _decode(member) -> int:
+    return int(member.decode("utf-8") if isinstance(member, (bytes, bytearray)) else member)
+
+
+def update(poll_ids: Iterable[int]) -> None:
+    """
+    Write the current rank_score of the given polls into the hot and topic sets they belong
+    to (sets that exist), remove those that left the feed, and trim the sets to FEED_ZSET_SIZE.
+    """
+    ids = list(poll_ids)
+    r = get_redis()
+    if r is None or not ids:
+        return
+    # poll_id -> (score, still in the feed?)
+    rows = {}
+    for pid, score, visibility, hidden in Poll.objects.filter(pk__in=ids).values_list(
+        "id", "rank_score", "visibility", "is_hidden"
+    ):
+        rows[pid] = (score, visibility == VisibilityMode.PUBLIC and not hidden)
+    topics: Dict[int, List[int]] = {}
+    for poll_id, topic_id in PollTopic.objects.filter(poll_id__in=rows).values_list("poll_id", "topic_id"):
+        topics.setdefault(poll_id, []).append(topic_id)
+
+    adds: Dict[str, Dict[int, float]] = {}
+    removes: Dict[str, List[int]] = {GLOBAL_KEY: [pid for pid in ids if pid not in rows]}
+    for pid, (score, listed) in rows.items():
+        for key in (GLOBAL_KEY, *[topic_key(t) for t in topics.get(pid, [])]):
+            if listed:
+                adds.setdefault(key, {})[pid] = score
+            else:
+                removes.setdefault(key, []).append(pid)
+    keys = sorted(set(adds) | {k for k, members in removes.items() if members})
+    if not keys:
+        return
+    size = feed_size()
+    try:
+        pipe = r.pipeline(transaction=False)
+        for key in keys:
+            pipe.exists(key)
+        existing = [key for key, found in zip(keys, pipe.execute()) if found]
+        if not existing:
+            return
+        pipe = r.pipeline(transaction=False)
+        for key in existing:
+            if key in adds:
+                pipe.zadd(key, adds[key])
+            if removes.get(key):
+                pipe.zrem(key, *removes[key])
+        trims = [key for key in existing if key in adds]
+        for key in trims:
+            pipe.zremrangebyrank(key, 0, -(size + 1))
+        replies = pipe.execute()
+        cut = [key for key, removed in zip(trims, replies[-len(trims):] if trims else []) if removed]
+        if cut:
+            r.hset(TRUNCATED_KEY, mapping={key: 1 for key in cut})
+    except Exception:
+        logger.warning("feeds: update failed for %d polls", len(ids))
+
+
+def _rebuild_key(pipe, key: str, qs, size: int) -> None:
+    ordered = qs.order_by("-rank_score", "-created_at", "-id").values_list("id", "rank_score")
+    members = dict(ordered[:size])
+    tmp = f"{key}:rebuild"
+    pipe.delete(tmp)
+    if members:
+        pipe.zadd(tmp, members)
+        pipe.rename(tmp, key)
+    else:
+        pipe.delete(key)
+    if len(members) >= size:
+        pipe.hset(TRUNCATED_KEY, key, 1)
+    else:
+        pipe.hdel(TRUNCATED_KEY, key)
+
+
+def rebuild(topic_ids: Optional[Iterable[int]] = None) -> int:
+    """Recreate the hot set and the topic sets from SQL (top FEED_ZSET_SIZE each). Returns the key count."""
+    r = get_redis()
+    if r is None:
+        return 0
+    size = feed_size()
+    if topic_ids is None:
+        topic_ids = Topic.objects.values_list("id", flat=True)
+    built = 0
+    for key, qs in [(GLOBAL_KEY, feed_polls())] + [
+        (topic_key(t), feed_polls().filter(polltopic__topic_id=t)) for t in topic_ids
+    ]:
+        pipe = r.pipeline(transaction=True)
+        _rebuild_key(pipe, key, qs, size)
+        pipe.execute()
+        built += 1
+    return built
+
+
+def session_keys(key: str, limit: int) -> Optional[List[Tuple[int, float]]]:
+    """
+    (poll_id, score) of the first `limit` members of the set `key` in feed order, to freeze
+    a feed session. Returns None when the set is missing or cut shorter than `limit`.
+    """
+    r = get_redis()
+    if r is None:
+        return None
+    try:
+        pipe = r.pipeline(transaction=False)
+        pipe.exists(key)
+        pipe.zrevrange(key, 0, limit - 1, withscores=True)
+        pipe.hexists(TRUNCATED_KEY, key)
+        found, entries, truncated = pipe.execute()
+    except Exception:
+        logger.warning("feeds: read failed for %s", key)
+        return None
+    if not found or (len(entries) < limit and truncated):
+        return None
+    # Ties: newer polls (higher ids) first, as in the SQL order.
+    keys = [(_decode(member), score) for member, score in entries]
+    keys.sort(key=lambda k: (k[1], k[0]), reverse=True)
+    return keys
+
+
+def fetch(key: str, queryset, position: Optional[list], snapshot, limit: int) -> Optional[list]:
+    """
+    Up to `limit` polls of `queryset` in feed order (-score, -created_at, -id) strictly after the
+    keyset `position`, created no later than `snapshot`, read from the sorted set `key`. Polls get
+    a `score` attribute. Returns None when the set is missing, or cannot fill the page exactly.
+    """
+    r = get_redis()
+    if r is None:
+        return None
+    # Extra members cover score ties around the cursor and members filtered out below.
+    want = 2 * limit
+    max_score = position[0] if position else "+inf"
+    try:
+        pipe = r.pipeline(transaction=False)
+        pipe.exists(key)
+        pipe.zrevrangebyscore(key, max_score, "-inf", start=0, num=want, withscores=True)
+        pipe.hexists(TRUNCATED_KEY, key)
+        found, entries, truncated = pipe.execute()
+    except Exception:
+        logger.warning("feeds: read failed for %s", key)
+        return None
+    if not found:
+        return None
+
+    scores = {_decode(member): score for member, score in entries}
+    polls = {p.pk: p for p in queryset.filter(pk__in=list(scores))}
+    stale = [pid for pid in scores if pid not in polls]
+    if stale:
+        try:
+            r.zrem(key, *stale)
+        except Exception:
+            logger.warning("feeds: cleanup failed for %s", key)
+
+    rows = []
+    for pid, poll in polls.items():
+        poll.score = scores[pid]
+        if poll.created_at > snapshot:
+            continue
+        if position is not None and (poll.score, poll.created_at, poll.pk) >= tuple(position):
+            continue
+        rows.append(poll)
+    rows.sort(key=lambda p: (p.score, p.created_at, p.pk), reverse=True)
+    # With a full read, members tied with the last one read may be missing from `entries`.
+    if len(rows) >= limit and (len(entries) < want or rows[limit - 1].score > entries[-1][1]):
+        return rows[:limit]
+    if len(entries) < want and not truncated:
+        # Reached the end of a complete set: this is the end of the feed.
+        return rows
+    return None
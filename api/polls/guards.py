@@ -0,0 +1,120 @@
+# polls/guards.py
+"""
+Per-worker cache of poll guard records used to validate votes.
+
+A guard holds what the vote path needs to accept or reject a vote (flags, close
+time, option ids) so votes on hot polls skip the Poll and PollOption queries.
+Entries expire after GUARD_TTL seconds and are evicted in every worker through
+a Redis pub/sub channel when a poll or its options change.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import FrozenSet, NamedTuple, Optional
+
+from django.utils import timezone
+
+from polls.models import Poll, PollOption
+from lib.cache.ttl_lru import TTLLRUCache
+from lib.redis.pubsub import get_redis
+
+logger = logging.getLogger(__name__)
+
+GUARD_TTL = 30
+GUARD_MAXSIZE = 10_000
+INVALIDATE_CHANNEL = "polls:guards:invalidate"
+# Seconds between listener (re)starts, so a Redis outage does not spawn a thread per lookup.
+LISTENER_RETRY = 5.0
+
+
+class PollGuard(NamedTuple):
+    id: int
+    is_hidden: bool
+    is_frozen: bool
+    closes_at: Optional[datetime]
+    option_ids: FrozenSet[int]
+
+    def is_open(self, now: Optional[datetime] = None) -> bool:
+        """Same rule as Poll.is_active."""
+        if self.is_hidden or self.is_frozen:
+            return False
+        if self.closes_at and (now or timezone.now()) >= self.closes_at:
+            return False
+        return True
+
+
+_cache = TTLLRUCache(maxsize=GUARD_MAXSIZE, ttl=GUARD_TTL)
+_listener: Optional[threading.Thread] = None
+_listener_lock = threading.Lock()
+_listener_started = 0.0
+
+
+def _listen(r) -> None:
+    try:
+        ps = r.pubsub(ignore_subscribe_messages=True)
+        ps.subscribe(INVALIDATE_CHANNEL)
+        for msg in ps.listen():
+            if msg.get("type") != "message":
+                continue
+            try:
+                _cache.delete(int(msg["data"]))
+            except (TypeError, ValueError):
+                _cache.clear()
+    except Exception:
+        # Entries still expire after GUARD_TTL; the next lookup restarts the listener.
+        logger.warning("poll guard invalidation listener stopped")
+
+
+def _ensure_listener() -> None:
+    global _listener, _listener_started
+    if _listener is not None and _listener.is_alive():
+        return
+    if time.monotonic() - _listener_started < LISTENER_RETRY:
+        return
+    with _listener_lock:
+        if _listener is not None and _listener.is_alive():
+            return
+        now = time.monotonic()
+        if now - _listener_started < LISTENER_RETRY:
+            return
+        _listener_started = now
+        r = get_redis()
+        if r is None:
+            # Without Redis entries only expire after GUARD_TTL; retry after the backoff.
+            return
+        _listener = threading.Thread(target=_listen, args=(r,), name="poll-guard-invalidation", daemon=True)
+        _listener.start()
+
+
+def _load(poll_id: int) -> Optional[PollGuard]:
+    row = Poll.objects.filter(pk=poll_id).values("id", "is_hidden", "is_frozen", "closes_at").first()
+    if row is None:
+        return None
+    option_ids = frozenset(PollOption.objects.filter(poll_id=poll_id).values_list("id", flat=True))
+    return PollGuard(option_ids=option_ids, **row)
+
+
+def get_guard(poll_id: int) -> Optional[PollGuard]:
+    """Return the guard record for a poll, or None if the poll does not exist."""
+    _ensure_listener()
+    guard = _cache.get(poll_id)
+    if guard is None:
+        guard = _load(poll_id)
+        if guard is not None:
+            _cache.set(poll_id, guard)
+    return guard
+
+
+def invalidate(poll_id: int) -> None:
+    """Evict a poll guard locally and in every other worker."""
+    _cache.delete(poll_id)
+    r = get_redis()
+    if r is None:
+        return
+    try:
+        r.publish(INVALIDATE_CHANNEL, str(poll_id))
+    except Exception:
+        logger.warning("poll guard invalidation publish failed for poll_id=%s", poll_id)
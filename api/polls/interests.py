@@ -0,0 +1,72 @@
+# polls/interests.py
+"""
+Cached interest sets of a user: followed topic ids and followed author ids.
+
+Stored as one JSON string per user, `polls:interests:{user_id}`, so a user who
+follows nothing is cached too. Filled from FollowTopic/FollowAuthor on a miss
+and dropped on commit by the FollowTopic/FollowAuthor save and delete signals
+(polls/signals.py); the TTL bounds drift from bulk writes that bypass signals.
+"""
+from __future__ import annotations
+
+import json
+import logging
+from typing import FrozenSet, NamedTuple
+
+from polls.models import FollowAuthor, FollowTopic
+from lib.redis.pubsub import get_redis
+
+logger = logging.getLogger(__name__)
+
+INTERESTS_KEY_FMT = "polls:interests:{user_id}"
+INTERESTS_TTL = 60 * 60
+
+
+class Interests(NamedTuple):
+    topic_ids: FrozenSet[int]
+    author_ids: FrozenSet[int]
+
+
+def interests_key(user_id: int) -> str:
+    return INTERESTS_KEY_FMT.format(user_id=user_id)
+
+
+def _load(user_id: int) -> Interests:
+    return Interests(
+        topic_ids=frozenset(FollowTopic.objects.filter(user_id=user_id).values_list("topic_id", flat=True)),
+        author_ids=frozenset(FollowAuthor.objects.filter(user_id=user_id).values_list("author_id", flat=True)),
+    )
+
+
+def get_interests(user_id: int) -> Interests:
+    """Followed topic and author ids of a user, from Redis when cached."""
+    r = get_redis()
+    key = interests_key(user_id)
+    if r is not None:
+        try:
+            raw = r.get(key)
+        except Exception:
+            logger.warning("interests: read failed for user_id=%s", user_id)
+            raw = None
+        if raw:
+            data = json.loads(raw)
+            return Interests(topic_ids=frozenset(data["t"]), author_ids=frozenset(data["a"]))
+    interests = _load(user_id)
+    if r is not None:
+        payload = json.dumps({"t": sorted(interests.topic_ids), "a": sorted(interests.author_ids)})
+        try:
+            r.set(key, payload, ex=INTERESTS_TTL)
+        except Exception:
+            logger.warning("interests: write failed for user_id=%s", user_id)
+    return interests
+
+
+def invalidate(user_id: int) -> None:
+    """Drop a user's cached interests (after a follow or unfollow)."""
+    r = get_redis()
+    if r is None:
+        return
+    try:
+        r.delete(interests_key(user_id))
+    except Exception:
+        logger.warning("interests: invalidate failed for user_id=%s", user_id)
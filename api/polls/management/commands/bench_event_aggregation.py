@@ -0,0 +1,109 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from polls import aggregation, rollups
+from lib.stats.ddsketch import DDSketch
+
+
+class Command(BaseCommand):
+    """
+    Benchmark the event aggregation engines on synthetic events (no database needed).
+
+    Folds the same N events with the per-row Python engine and the NumPy engine,
+    checks that both produce the same totals and prints the timings. Both are also
+    compared with the fold aggregate_events ran before the engines were split out
+    (`_baseline_fold`, unweighted), which is what the speedups are measured against.
+
+    Examples:
+      python manage.py bench_event_aggregation
+      python manage.py bench_event_aggregation --events 5000000 --polls 20000
+    """
+    help = "Benchmark python vs numpy event aggregation on synthetic events."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=1_000_000, help='Number of synthetic events')
+        parser.add_argument('--polls', type=int, default=5_000, help='Number of distinct polls')
+        parser.add_argument('--hours', type=int, default=48, help='Time span of the events in hours')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **opts):
+        if aggregation.np is None:
+            raise CommandError("numpy is not installed")
+        n = opts['events']
+        rng = random.Random(opts['seed'])
+        start = datetime.now(dt_timezone.utc).replace(minute=0, second=0, microsecond=0) - timedelta(hours=opts['hours'])
+        start_epoch = int(start.timestamp())
+        span = opts['hours'] * 3600
+        kinds = ['dwell'] * 6 + ['share'] * 1 + ['vote'] * 3
+
+        self.stdout.write(f"generating {n} events over {opts['polls']} polls...")
+        numeric, rows = [], []
+        for event_id in range(1, n + 1):
+            poll_id = rng.randint(1, opts['polls'])
+            kind = rng.choice(kinds)
+            dwell_ms = int(rng.lognormvariate(8, 1)) if kind == 'dwell' else 0
+            epoch = start_epoch + rng.randrange(span)
+            # half the dwell events as if collected with 1-in-10 sampling
+            weight = rng.choice((1, 10)) if kind == 'dwell' else 1
+            numeric.append((event_id, poll_id, aggregation.KIND_CODES[kind], dwell_ms, epoch, weight))
+            rows.append((event_id, poll_id, kind, dwell_ms, datetime.fromtimestamp(epoch, tz=dt_timezone.utc), weight))
+
+        t0 = time.perf_counter()
+        _baseline_fold(iter(rows))
+        t_base = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        py = aggregation.fold_rows(iter(rows), 0)
+        t_py = time.perf_counter() - t0
+
+        chunks = (numeric[i:i + aggregation.CHUNK_SIZE] for i in range(0, n, aggregation.CHUNK_SIZE))
+        t0 = time.perf_counter()
+        vec = aggregation.fold_chunks(chunks, 0)
+        t_np = time.perf_counter() - t0
+
+        self._check(py, vec)
+        self.stdout.write(f"baseline: {t_base:8.2f}s  ({n / t_base:,.0f} events/s)")
+        self.stdout.write(f"python:   {t_py:8.2f}s  ({n / t_py:,.0f} events/s, {t_base / t_py:.1f}x)")
+        self.stdout.write(f"numpy:    {t_np:8.2f}s  ({n / t_np:,.0f} events/s, {t_base / t_np:.1f}x)")
+        self.stdout.write(self.style.SUCCESS(f"numpy vs baseline: {t_base / t_np:.1f}x, engines match"))
+
+    def _check(self, a, b):
+        if (a.count, a.last_id) != (b.count, b.last_id):
+            raise CommandError("engines disagree on batch size or watermark")
+        for pid, rec in a.polls.items():
+            other = b.polls.get(pid)
+            for key in ('vote', 'share', 'dwell', 'dwell_sum'):
+                if other is None or rec[key] != other[key]:
+                    raise CommandError(f"engines disagree on poll {pid} {key}")
+            if rec['sketch'].count != other['sketch'].count:
+                raise CommandError(f"engines disagree on poll {pid} sketch")
+        if a.hourly != b.hourly:
+            raise CommandError("engines disagree on hourly metrics")
+        if {k: s.count for k, s in a.daily_sketches.items()} != {k: s.count for k, s in b.daily_sketches.items()}:
+            raise CommandError("engines disagree on daily sketches")
+
+
+def _baseline_fold(rows):
+    """The per-event loop of aggregate_events before polls/aggregation.py (weights ignored)."""
+    data = {}
+    daily_sketches = {}
+    hourly = {}
+    last_id = 0
+    for event_id, poll_id, kind, dwell_ms, ts, _weight in rows:
+        rec = data.setdefault(poll_id, {'vote': 0, 'share': 0, 'dwell': 0, 'dwell_sum': 0, 'sketch': DDSketch()})
+        if kind in rec:
+            rec[kind] += 1
+        hour = rollups.bucket_start(ts, 'hour')
+        if kind == 'share':
+            hourly[(poll_id, 'shares', hour)] = hourly.get((poll_id, 'shares', hour), 0) + 1
+        if kind == 'dwell':
+            rec['dwell_sum'] += dwell_ms or 0
+            rec['sketch'].add(dwell_ms or 0)
+            daily_sketches.setdefault((poll_id, ts.astimezone(dt_timezone.utc).date()), DDSketch()).add(dwell_ms or 0)
+            hourly[(poll_id, 'dwell_count', hour)] = hourly.get((poll_id, 'dwell_count', hour), 0) + 1
+            hourly[(poll_id, 'dwell_ms_sum', hour)] = hourly.get((poll_id, 'dwell_ms_sum', hour), 0) + (dwell_ms or 0)
+        last_id = event_id
+    return data, daily_sketches, hourly, last_id
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from polls import partitions
+
+
+class Command(BaseCommand):
+    """
+    Create upcoming daily Event partitions and drop expired ones (PostgreSQL).
+
+    Examples:
+      python manage.py event_partitions
+      python manage.py event_partitions --ahead 7 --retention-days 3
+    """
+    help = "Maintain daily partitions of the Event table (create ahead, drop expired)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=None, help='Days of partitions to create ahead (default: EVENT_PARTITIONS_AHEAD)')
+        parser.add_argument('--retention-days', type=int, default=None, help='Days of events to keep (default: EVENT_RETENTION_DAYS)')
+
+    def handle(self, *args, **opts):
+        if not partitions.is_partitioned():
+            self.stdout.write(self.style.WARNING("Event table is not partitioned; nothing to do."))
+            return
+        created, dropped = partitions.maintain(ahead=opts['ahead'], retention_days=opts['retention_days'])
+        for name in created:
+            self.stdout.write(f"created {name}")
+        for name in dropped:
+            self.stdout.write(f"dropped {name}")
+        self.stdout.write(self.style.SUCCESS(f"{len(created)} created, {len(dropped)} dropped"))
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0003_userprofile_is_private'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollStatsShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('total_votes', models.PositiveIntegerField(default=0)),
+                ('option_counts', models.JSONField(default=dict)),
+                ('poll', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats_shards', to='polls.poll')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='pollstatsshard',
+            constraint=models.UniqueConstraint(fields=('poll', 'shard'), name='uniq_pollstatsshard_poll_shard'),
+        ),
+    ]
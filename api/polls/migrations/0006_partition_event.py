@@ -0,0 +1,79 @@
+# Converts polls_event into a daily range-partitioned table on PostgreSQL.
+# Model state is unchanged; other backends keep the plain table.
+
+from datetime import datetime, timedelta, timezone
+
+from django.db import migrations
+
+# Event columns as of this migration (later migrations add more).
+COLUMNS = "id, kind, device_id, ts, dwell_ms, author_id, poll_id"
+
+
+def partition_events(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    from polls import partitions as p
+
+    with schema_editor.connection.cursor() as cur:
+        if p.is_partitioned(cur):
+            return
+        cur.execute(f"ALTER TABLE {p.PARENT} RENAME TO {p.PARENT}_unpartitioned")
+        cur.execute("ALTER INDEX idx_event_poll_ts RENAME TO idx_event_poll_ts_unpartitioned")
+        cur.execute("ALTER INDEX idx_event_kind_ts RENAME TO idx_event_kind_ts_unpartitioned")
+        for sql in p.CREATE_PARENT_SQL:
+            cur.execute(sql)
+
+        today = datetime.now(timezone.utc).date()
+        cur.execute(f"SELECT min(ts) FROM {p.PARENT}_unpartitioned")
+        oldest = cur.fetchone()[0]
+        first_day = min(oldest.astimezone(timezone.utc).date(), today) if oldest else today
+        p.ensure_partitions(cur, first_day, today + timedelta(days=3))
+
+        cur.execute(
+            f"INSERT INTO {p.PARENT} ({COLUMNS}) SELECT {COLUMNS} FROM {p.PARENT}_unpartitioned"
+        )
+        cur.execute(
+            f"SELECT setval('{p.ID_SEQUENCE}', COALESCE((SELECT max(id) FROM {p.PARENT}), 0) + 1, false)"
+        )
+        cur.execute(f"DROP TABLE {p.PARENT}_unpartitioned")
+
+
+def unpartition_events(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    from polls import partitions as p
+
+    with schema_editor.connection.cursor() as cur:
+        if not p.is_partitioned(cur):
+            return
+        cur.execute(f"ALTER TABLE {p.PARENT} RENAME TO {p.PARENT}_partitioned")
+        cur.execute("ALTER INDEX idx_event_poll_ts RENAME TO idx_event_poll_ts_partitioned")
+        cur.execute("ALTER INDEX idx_event_kind_ts RENAME TO idx_event_kind_ts_partitioned")
+        cur.execute(f"ALTER SEQUENCE {p.ID_SEQUENCE} OWNED BY NONE")
+        cur.execute(
+            f"CREATE TABLE {p.PARENT} ("
+            f"id bigint PRIMARY KEY DEFAULT nextval('{p.ID_SEQUENCE}'), "
+            "kind varchar(16) NOT NULL, device_id varchar(64) NOT NULL, "
+            "ts timestamp with time zone NOT NULL, dwell_ms integer NOT NULL CHECK (dwell_ms >= 0), "
+            "author_id bigint NULL REFERENCES polls_user (id) DEFERRABLE INITIALLY DEFERRED, "
+            "poll_id bigint NOT NULL REFERENCES polls_poll (id) DEFERRABLE INITIALLY DEFERRED)"
+        )
+        cur.execute(f"ALTER SEQUENCE {p.ID_SEQUENCE} OWNED BY {p.PARENT}.id")
+        cur.execute(f"CREATE INDEX idx_event_poll_ts ON {p.PARENT} (poll_id, ts)")
+        cur.execute(f"CREATE INDEX idx_event_kind_ts ON {p.PARENT} (kind, ts)")
+        cur.execute(f"CREATE INDEX polls_event_author_id_idx ON {p.PARENT} (author_id)")
+        cur.execute(
+            f"INSERT INTO {p.PARENT} ({COLUMNS}) SELECT {COLUMNS} FROM {p.PARENT}_partitioned"
+        )
+        cur.execute(f"DROP TABLE {p.PARENT}_partitioned CASCADE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("polls", "0005_aggregationwatermark"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_events, unpartition_events),
+    ]
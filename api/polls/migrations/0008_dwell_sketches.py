@@ -0,0 +1,38 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0007_voterollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pollagg',
+            name='dwell_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of dwell samples.'),
+        ),
+        migrations.AddField(
+            model_name='pollagg',
+            name='dwell_sketch',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.CreateModel(
+            name='DwellSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('sketch', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('poll', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dwell_sketches', to='polls.poll')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dwellsketch',
+            constraint=models.UniqueConstraint(fields=('poll', 'day'), name='uniq_dwellsketch_poll_day'),
+        ),
+    ]
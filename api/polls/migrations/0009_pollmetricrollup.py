@@ -0,0 +1,29 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0008_dwell_sketches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollMetricRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=16)),
+                ('granularity', models.CharField(choices=[('hour', 'hour'), ('day', 'day')], max_length=8)),
+                ('bucket_start', models.DateTimeField()),
+                ('value', models.BigIntegerField(default=0)),
+                ('poll', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metric_rollups', to='polls.poll')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='pollmetricrollup',
+            constraint=models.UniqueConstraint(fields=('poll', 'metric', 'granularity', 'bucket_start'), name='uniq_pollmetricrollup_bucket'),
+        ),
+    ]
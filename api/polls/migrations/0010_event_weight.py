@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0009_pollmetricrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='weight',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Number of events this one stands for under sampling (polls/sampling.py).'),
+        ),
+    ]
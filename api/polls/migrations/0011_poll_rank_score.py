@@ -0,0 +1,80 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:19
+
+from django.db import migrations, models
+from django.db.models import DateTimeField, F, FloatField, Func, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Exp, Ln
+from django.utils import timezone
+
+# Feed score as of this migration (polls/ranking.py may change later):
+#   0.6 * ln(1 + votes) + 0.4 * exp(-age_hours / 24)
+W_TREND = 0.6
+W_FRESH = 0.4
+
+
+class AgeSeconds(Func):
+    # Seconds from created_at to `now`; SQLite has no duration type, so use julianday() there.
+    template = "EXTRACT(EPOCH FROM (%(expressions)s))"
+    arg_joiner = " - "
+    output_field = FloatField()
+
+    def __init__(self, now):
+        super().__init__(Value(now, output_field=DateTimeField()), F("created_at"))
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template="((julianday(%(expressions)s)) * 86400.0)",
+            arg_joiner=") - julianday(",
+            **extra_context,
+        )
+
+
+def score_expression(now, votes):
+    age_hours = Cast(AgeSeconds(now), FloatField()) / Value(3600.0)
+    fresh = Exp(-age_hours / Value(24.0))
+    trend = Ln(Value(1.0) + Cast(votes, FloatField()))
+    return Value(W_TREND) * trend + Value(W_FRESH) * fresh
+
+
+def backfill_rank_scores(apps, schema_editor):
+    Poll = apps.get_model("polls", "Poll")
+    PollStats = apps.get_model("polls", "PollStats")
+    votes = Coalesce(
+        Subquery(PollStats.objects.filter(poll_id=OuterRef("pk")).values("total_votes")[:1]),
+        Value(0),
+    )
+    now = timezone.now()
+    Poll.objects.update(rank_score=score_expression(now, votes), rank_votes=votes, rank_updated_at=now)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0010_event_weight'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='poll',
+            name='rank_score',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='poll',
+            name='rank_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='poll',
+            name='rank_votes',
+            field=models.PositiveIntegerField(default=0, help_text='Vote total rank_score was computed from.'),
+        ),
+        migrations.AddIndex(
+            model_name='poll',
+            index=models.Index(fields=['visibility', '-rank_score', '-created_at', '-id'], name='poll_vis_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='poll',
+            index=models.Index(fields=['rank_updated_at'], name='poll_rank_updated_idx'),
+        ),
+        migrations.RunPython(backfill_rank_scores, migrations.RunPython.noop),
+    ]
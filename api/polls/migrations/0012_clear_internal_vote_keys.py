@@ -0,0 +1,20 @@
+# Votes persisted by the vote-batch endpoint and the ingest stream used to store
+# generated "batch:"/"ingest:" keys in Vote.idempotency_key; only client keys belong there.
+
+from django.db import migrations
+
+
+def clear_internal_keys(apps, schema_editor):
+    Vote = apps.get_model("polls", "Vote")
+    Vote.objects.filter(idempotency_key__regex=r"^(batch|ingest):[0-9a-f]{32}$").update(idempotency_key=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0011_poll_rank_score'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_internal_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0012_clear_internal_vote_keys'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='event',
+            name='author',
+            field=models.ForeignKey(blank=True, help_text='Author of the poll (collection is unauthenticated, so the viewer is only the device).', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='events', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
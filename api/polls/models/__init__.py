@@ -5,13 +5,13 @@ Public re-exports for stable import paths:
 """
 from .user import User
 from .topic import Topic
-from .stats import PollStats
+from .stats import PollStats, PollStatsShard
 from .poll import Poll, PollOption, PollTopic, ResultsMode, VisibilityMode
 from .vote import Vote
 from .report import Report
 from .profile import UserProfile
 from .magiclink import MagicLinkToken
-from .analytics import Event, PollAgg
+from .analytics import Event, PollAgg, DwellSketch, VoteRollup, PollMetricRollup, AggregationWatermark
 from .follow import FollowTopic, FollowAuthor
 from .comment import Comment
 
@@ -19,6 +19,7 @@ __all__ = [
     "User",
     "Topic",
     "PollStats",
+    "PollStatsShard",
     "Poll",
     "PollOption",
     "PollTopic",
@@ -30,6 +31,10 @@ __all__ = [
     "MagicLinkToken",
     "Event", 
     "PollAgg",
+    "DwellSketch",
+    "VoteRollup",
+    "PollMetricRollup",
+    "AggregationWatermark",
     "FollowTopic",
     "FollowAuthor",
     "Comment",
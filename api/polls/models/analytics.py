@@ -9,6 +9,10 @@ class Event(models.Model):
     """
     Represents a single user or device event related to a poll.
     Used for lightweight analytics collection (views, votes, shares, dwell time).
+
+    On PostgreSQL the table is range-partitioned by day on `ts` (migration 0006,
+    polls/partitions.py); filter on `ts` so queries only touch recent partitions.
+    Aggregates sum `weight`, not rows, so sampled kinds still give unbiased totals.
     """
 
     class Kind(models.TextChoices):
@@ -25,11 +29,15 @@ class Event(models.Model):
         blank=True,
         on_delete=models.SET_NULL,
         related_name="events",
-        help_text="Authenticated user who triggered the event (if any).",
+        help_text="Author of the poll (collection is unauthenticated, so the viewer is only the device).",
     )
     device_id = models.CharField(max_length=64, blank=True)
     ts = models.DateTimeField(auto_now_add=True)
     dwell_ms = models.PositiveIntegerField(default=0, help_text="Dwell time in milliseconds (if applicable).")
+    weight = models.PositiveSmallIntegerField(
+        default=1,
+        help_text="Number of events this one stands for under sampling (polls/sampling.py).",
+    )
 
     class Meta:
         indexes = [
@@ -59,6 +67,9 @@ class PollAgg(models.Model):
     shares = models.PositiveIntegerField(default=0)
     dwell_ms_sum = models.BigIntegerField(default=0)
     dwell_ms_avg = models.IntegerField(default=0)
+    dwell_count = models.PositiveIntegerField(default=0, help_text="Number of dwell samples.")
+    # Serialized lib.stats.ddsketch.DDSketch of all dwell samples (for percentiles)
+    dwell_sketch = models.JSONField(default=dict, blank=True)
 
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -71,3 +82,99 @@ class PollAgg(models.Model):
 
     def __str__(self) -> str:
         return f"PollAgg(Poll#{self.poll_id}) views={self.views} votes={self.votes}"
+
+
+class DwellSketch(models.Model):
+    """
+    Dwell-time quantile sketch (serialized DDSketch) of one poll for one UTC day.
+    Daily sketches merge exactly, so percentiles over any date range need no raw events.
+    """
+    poll = models.ForeignKey("polls.Poll", on_delete=models.CASCADE, related_name="dwell_sketches")
+    day = models.DateField()
+    sketch = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["poll", "day"], name="uniq_dwellsketch_poll_day"),
+        ]
+
+    def __str__(self) -> str:
+        return f"DwellSketch(Poll#{self.poll_id} {self.day})"
+
+
+class VoteRollup(models.Model):
+    """
+    Votes per option per time bucket (minute, hour and day, UTC), for trend charts and
+    velocity. Filled incrementally from the Vote table by the rollup_votes task; votes
+    deleted later are not subtracted.
+    """
+
+    class Granularity(models.TextChoices):
+        MINUTE = "minute", "minute"
+        HOUR = "hour", "hour"
+        DAY = "day", "day"
+
+    poll = models.ForeignKey("polls.Poll", on_delete=models.CASCADE, related_name="vote_rollups")
+    option = models.ForeignKey("polls.PollOption", on_delete=models.CASCADE, related_name="vote_rollups")
+    granularity = models.CharField(max_length=8, choices=Granularity.choices)
+    bucket_start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["poll", "granularity", "bucket_start", "option"],
+                name="uniq_voterollup_bucket",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["granularity", "bucket_start"], name="idx_voterollup_gran_bucket"),
+        ]
+
+    def __str__(self) -> str:
+        return f"VoteRollup(Poll#{self.poll_id}/O{self.option_id} {self.granularity} {self.bucket_start:%Y-%m-%d %H:%M}) = {self.count}"
+
+
+class PollMetricRollup(models.Model):
+    """
+    Per-poll analytics metric summed per hour and per day (UTC): views, shares,
+    dwell_count, dwell_ms_sum. Written by flush_view_counts and aggregate_events;
+    serves the analytics query API without touching Event.
+    """
+
+    class Granularity(models.TextChoices):
+        HOUR = "hour", "hour"
+        DAY = "day", "day"
+
+    poll = models.ForeignKey("polls.Poll", on_delete=models.CASCADE, related_name="metric_rollups")
+    metric = models.CharField(max_length=16)
+    granularity = models.CharField(max_length=8, choices=Granularity.choices)
+    bucket_start = models.DateTimeField()
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["poll", "metric", "granularity", "bucket_start"],
+                name="uniq_pollmetricrollup_bucket",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"PollMetricRollup(Poll#{self.poll_id} {self.metric} {self.granularity} {self.bucket_start:%Y-%m-%d %H:%M}) = {self.value}"
+
+
+class AggregationWatermark(models.Model):
+    """
+    High-water mark of an incremental aggregation: the last source row id (Event.id for
+    aggregate_events, Vote.id for rollup_votes) folded into the aggregates, or the last
+    applied batch number (flush_view_counts). Advanced in the same transaction as the
+    aggregate writes.
+    """
+    name = models.CharField(max_length=64, primary_key=True)
+    last_event_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"AggregationWatermark({self.name}) at Event#{self.last_event_id}"
@@ -42,6 +42,11 @@ class Poll(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Feed ranking, materialized by polls/ranking.py (refresh_rank_scores)
+    rank_score = models.FloatField(default=0.0)
+    rank_votes = models.PositiveIntegerField(default=0, help_text="Vote total rank_score was computed from.")
+    rank_updated_at = models.DateTimeField(null=True, blank=True)
+
     topics = models.ManyToManyField("polls.Topic", through="polls.PollTopic", related_name="polls")
 
     class Meta:
@@ -50,6 +55,8 @@ class Poll(models.Model):
             models.Index(fields=["visibility", "-created_at"], name="poll_vis_created_idx"),
             models.Index(fields=["under_review", "-created_at"], name="poll_under_review_idx"),
             models.Index(fields=["-reports_total"], name="poll_reports_total_idx"),
+            models.Index(fields=["visibility", "-rank_score", "-created_at", "-id"], name="poll_vis_rank_idx"),
+            models.Index(fields=["rank_updated_at"], name="poll_rank_updated_idx"),
         ]
 
     def __str__(self) -> str:
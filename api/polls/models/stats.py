@@ -1,5 +1,57 @@
 # polls/models/stats.py
-from django.db import models
+import random
+import zlib
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Func, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+
+class JSONBIncrement(Func):
+    """
+    Add `delta` to an integer stored under `key` in a JSON object column (JSONB on PostgreSQL,
+    the JSON1 functions on SQLite). Missing keys count as 0; keys that drop to 0 or below are removed.
+    """
+    output_field = models.JSONField()
+
+    def __init__(self, field: str, key, delta: int):
+        super().__init__(F(field))
+        self.key = str(key)
+        self.delta = int(delta)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        col, params = compiler.compile(self.source_expressions[0])
+        new_value = f"(COALESCE(({col} ->> %s::text)::bigint, 0) + %s)"
+        sql = (
+            f"CASE WHEN {new_value} > 0 "
+            f"THEN jsonb_set(COALESCE({col}, '{{}}'::jsonb), ARRAY[%s]::text[], to_jsonb({new_value})) "
+            f"ELSE COALESCE({col}, '{{}}'::jsonb) - %s::text END"
+        )
+        value_params = (*params, self.key, self.delta)
+        return sql, (
+            *value_params,
+            *params, self.key, *value_params,
+            *params, self.key,
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        col, params = compiler.compile(self.source_expressions[0])
+        path = '$."%s"' % self.key
+        new_value = f"(COALESCE(json_extract({col}, %s), 0) + %s)"
+        sql = (
+            f"CASE WHEN {new_value} > 0 "
+            f"THEN json_set(COALESCE({col}, '{{}}'), %s, {new_value}) "
+            f"ELSE json_remove(COALESCE({col}, '{{}}'), %s) END"
+        )
+        value_params = (*params, path, self.delta)
+        return sql, (
+            *value_params,
+            *params, path, *value_params,
+            *params, path,
+        )
+
 
 class PollStats(models.Model):
     """
@@ -22,3 +74,141 @@ class PollStats(models.Model):
 
     def __str__(self) -> str:
         return f"PollStats({self.poll_id}) votes={self.total_votes}"
+
+    @classmethod
+    def apply_vote(cls, poll_id: int, option_id: int, delta: int = 1, shard_key=None) -> None:
+        """
+        Atomically add `delta` votes for an option with a single UPDATE (no read-modify-write).
+        The row is created on the first positive delta; negative deltas never create it.
+
+        With POLL_STATS_SHARDS > 0, positive deltas go to one of the poll's PollStatsShard rows
+        (picked by `shard_key`, e.g. the voter hash) and are folded in later by
+        fold_poll_stats_shards. Negative deltas (rare vote deletions) fold the poll's pending
+        shards into this row first, so a vote still sitting in a shard is not clamped away.
+        """
+        if stats_shard_count():
+            if delta > 0:
+                PollStatsShard.apply_vote(poll_id, option_id, delta, shard_key=shard_key)
+                return
+            with transaction.atomic():
+                cls.fold_shards([poll_id], skip_locked=False)
+                cls._apply(poll_id, option_id, delta)
+            return
+        cls._apply(poll_id, option_id, delta)
+
+    @classmethod
+    def _apply(cls, poll_id: int, option_id: int, delta: int) -> None:
+        def _update() -> int:
+            return cls.objects.filter(poll_id=poll_id).update(
+                total_votes=Greatest(F("total_votes") + Value(delta), Value(0)),
+                option_counts=JSONBIncrement("option_counts", option_id, delta),
+                updated_at=timezone.now(),
+            )
+
+        if _update() or delta <= 0:
+            return
+        cls.objects.get_or_create(poll_id=poll_id)
+        _update()
+
+    @classmethod
+    def fold_shards(cls, poll_ids=None, skip_locked: bool = True) -> int:
+        """
+        Move pending PollStatsShard deltas into PollStats (all polls, or `poll_ids`).
+        Must run inside a transaction; locks shards before stats rows. Returns the poll count.
+        """
+        pending = PollStatsShard.drain(poll_ids, skip_locked=skip_locked)
+        if not pending:
+            return 0
+        cls.objects.bulk_create([cls(poll_id=pid) for pid in pending], ignore_conflicts=True)
+        now = timezone.now()
+        stats = list(cls.objects.select_for_update().filter(poll_id__in=list(pending)))
+        for s in stats:
+            counts, total = pending[s.poll_id]
+            merged = dict(s.option_counts or {})
+            for option_id, c in counts.items():
+                merged[option_id] = merged.get(option_id, 0) + c
+            s.option_counts = merged
+            s.total_votes += total
+            s.updated_at = now
+        cls.objects.bulk_update(stats, ["option_counts", "total_votes", "updated_at"])
+        return len(stats)
+
+    def live_counts(self) -> tuple:
+        """({option_id: count}, total_votes) including deltas not yet folded from the shards."""
+        counts = {str(k): v for k, v in (self.option_counts or {}).items()}
+        total = self.total_votes
+        if stats_shard_count():
+            for shard in PollStatsShard.objects.filter(poll_id=self.poll_id, total_votes__gt=0):
+                total += shard.total_votes
+                for option_id, c in (shard.option_counts or {}).items():
+                    counts[option_id] = counts.get(option_id, 0) + c
+        return counts, total
+
+
+def stats_shard_count() -> int:
+    return getattr(settings, "POLL_STATS_SHARDS", 0)
+
+
+class PollStatsShard(models.Model):
+    """
+    Pending vote deltas for a poll, split over POLL_STATS_SHARDS rows so concurrent voters
+    on a hot poll update different rows instead of queueing on the single PollStats row lock.
+    """
+    poll = models.ForeignKey("polls.Poll", on_delete=models.CASCADE, related_name="stats_shards")
+    shard = models.PositiveSmallIntegerField()
+
+    total_votes = models.PositiveIntegerField(default=0)
+    option_counts = models.JSONField(default=dict)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["poll", "shard"], name="uniq_pollstatsshard_poll_shard"),
+        ]
+
+    def __str__(self) -> str:
+        return f"PollStatsShard({self.poll_id}#{self.shard}) votes={self.total_votes}"
+
+    @staticmethod
+    def shard_for(shard_key=None) -> int:
+        n = stats_shard_count() or 1
+        if shard_key is None:
+            return random.randrange(n)
+        return zlib.crc32(str(shard_key).encode("utf-8")) % n
+
+    @classmethod
+    def apply_vote(cls, poll_id: int, option_id: int, delta: int = 1, shard_key=None) -> None:
+        """Add positive `delta` votes to one shard row with a single UPDATE, creating it on first use."""
+        shard = cls.shard_for(shard_key)
+
+        def _update() -> int:
+            return cls.objects.filter(poll_id=poll_id, shard=shard).update(
+                total_votes=F("total_votes") + Value(delta),
+                option_counts=JSONBIncrement("option_counts", option_id, delta),
+            )
+
+        if _update():
+            return
+        cls.objects.get_or_create(poll_id=poll_id, shard=shard)
+        _update()
+
+    @classmethod
+    def drain(cls, poll_ids=None, skip_locked: bool = True) -> dict:
+        """
+        Lock non-empty shards, zero them and return {poll_id: ({option_id: count}, total)}.
+        Must run inside a transaction. With `skip_locked`, rows held by in-flight writers are
+        left for the next call instead of waited on.
+        """
+        qs = cls.objects.select_for_update(skip_locked=skip_locked).filter(total_votes__gt=0)
+        if poll_ids is not None:
+            qs = qs.filter(poll_id__in=poll_ids)
+        shards = list(qs)
+        pending = {}
+        for shard in shards:
+            counts, total = pending.get(shard.poll_id, ({}, 0))
+            for option_id, c in (shard.option_counts or {}).items():
+                counts[option_id] = counts.get(option_id, 0) + c
+            pending[shard.poll_id] = (counts, total + shard.total_votes)
+            shard.total_votes = 0
+            shard.option_counts = {}
+        cls.objects.bulk_update(shards, ["total_votes", "option_counts"])
+        return pending
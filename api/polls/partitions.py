@@ -0,0 +1,169 @@
+# polls/partitions.py
+"""
+Daily range partitions of the Event table (PostgreSQL).
+
+`polls_event` is PARTITION BY RANGE (ts) with one partition per UTC day,
+`polls_event_pYYYYMMDD`, plus `polls_event_default` as a catch-all. Partitions
+are created EVENT_PARTITIONS_AHEAD days ahead and dropped once older than
+EVENT_RETENTION_DAYS, so retention is a DROP TABLE instead of a row-by-row DELETE.
+A partition is only dropped once aggregate_events has folded all of its rows
+(max(id) <= the aggregation watermark); otherwise it is kept until it has.
+
+Kept free of model imports so migrations can use it.
+"""
+from __future__ import annotations
+
+import logging
+import re
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+PARENT = "polls_event"
+DEFAULT_PARTITION = f"{PARENT}_default"
+ID_SEQUENCE = f"{PARENT}_ids"
+
+# AggregationWatermark row of aggregate_events (read with SQL: no model imports here).
+EVENTS_WATERMARK = "aggregate_events"
+WATERMARK_TABLE = "polls_aggregationwatermark"
+
+_NAME_RE = re.compile(rf"^{PARENT}_p(\d{{8}})$")
+
+# Parent table: the primary key must include the partition key, so it is (id, ts);
+# ids still come from one sequence and stay unique.
+# This is the schema migration 0006 creates; columns added later come from regular migrations.
+CREATE_PARENT_SQL = [
+    f"CREATE SEQUENCE IF NOT EXISTS {ID_SEQUENCE}",
+    f"""
+    CREATE TABLE {PARENT} (
+        id bigint NOT NULL DEFAULT nextval('{ID_SEQUENCE}'),
+        kind varchar(16) NOT NULL,
+        device_id varchar(64) NOT NULL,
+        ts timestamp with time zone NOT NULL,
+        dwell_ms integer NOT NULL CHECK (dwell_ms >= 0),
+        author_id bigint NULL REFERENCES polls_user (id) DEFERRABLE INITIALLY DEFERRED,
+        poll_id bigint NOT NULL REFERENCES polls_poll (id) DEFERRABLE INITIALLY DEFERRED,
+        PRIMARY KEY (id, ts)
+    ) PARTITION BY RANGE (ts)
+    """,
+    f"ALTER SEQUENCE {ID_SEQUENCE} OWNED BY {PARENT}.id",
+    f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT",
+    f"CREATE INDEX idx_event_poll_ts ON {PARENT} (poll_id, ts)",
+    f"CREATE INDEX idx_event_kind_ts ON {PARENT} (kind, ts)",
+    f"CREATE INDEX polls_event_author_id_idx ON {PARENT} (author_id)",
+]
+
+
+def partition_name(day: date) -> str:
+    return f"{PARENT}_p{day:%Y%m%d}"
+
+
+def _bounds(day: date) -> Tuple[datetime, datetime]:
+    start = datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+def is_partitioned(cursor=None) -> bool:
+    if connection.vendor != "postgresql":
+        return False
+    if cursor is None:
+        with connection.cursor() as cur:
+            return is_partitioned(cur)
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+        [PARENT],
+    )
+    return cursor.fetchone() is not None
+
+
+def existing_partitions(cursor) -> Dict[date, str]:
+    """{day: partition name} of the daily partitions currently attached."""
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = %s",
+        [PARENT],
+    )
+    days = {}
+    for (name,) in cursor.fetchall():
+        m = _NAME_RE.match(name)
+        if m:
+            days[datetime.strptime(m.group(1), "%Y%m%d").date()] = name
+    return days
+
+
+def create_partition(cursor, day: date) -> str:
+    """
+    Create and attach the partition for one UTC day. Rows of that day that landed in
+    the default partition are moved into it first, otherwise ATTACH would fail.
+    """
+    name = partition_name(day)
+    start, end = _bounds(day)
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    cursor.execute(
+        # The partition is created LIKE the parent, so its columns line up with the default partition's.
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE ts >= %s AND ts < %s RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved",
+        [start, end],
+    )
+    cursor.execute(f"ALTER TABLE {PARENT} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", [start, end])
+    return name
+
+
+def ensure_partitions(cursor, first_day: date, last_day: date) -> List[str]:
+    existing = existing_partitions(cursor)
+    created = []
+    day = first_day
+    while day <= last_day:
+        if day not in existing:
+            created.append(create_partition(cursor, day))
+        day += timedelta(days=1)
+    return created
+
+
+def aggregated_up_to(cursor) -> int:
+    """Last Event id folded by aggregate_events (0 before its first run)."""
+    cursor.execute(f"SELECT last_event_id FROM {WATERMARK_TABLE} WHERE name = %s", [EVENTS_WATERMARK])
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def maintain(ahead: Optional[int] = None, retention_days: Optional[int] = None, today: Optional[date] = None):
+    """
+    Create partitions up to `ahead` days from today and drop those older than `retention_days`
+    whose events are all aggregated. Returns (created, dropped) partition names; a no-op unless
+    the Event table is partitioned.
+    """
+    ahead = getattr(settings, "EVENT_PARTITIONS_AHEAD", 3) if ahead is None else ahead
+    retention_days = getattr(settings, "EVENT_RETENTION_DAYS", 2) if retention_days is None else retention_days
+    today = today or datetime.now(dt_timezone.utc).date()
+    cutoff = today - timedelta(days=retention_days)
+
+    with transaction.atomic(), connection.cursor() as cur:
+        if not is_partitioned(cur):
+            return [], []
+        created = ensure_partitions(cur, today, today + timedelta(days=ahead))
+        watermark = aggregated_up_to(cur)
+        dropped = []
+        for day, name in sorted(existing_partitions(cur).items()):
+            if day >= cutoff:
+                continue
+            cur.execute(f"SELECT max(id) FROM {name}")
+            max_id = cur.fetchone()[0]
+            if max_id is not None and max_id > watermark:
+                logger.warning(
+                    "event partitions: keeping expired %s, events up to %s not aggregated (watermark %s)",
+                    name, max_id, watermark,
+                )
+                continue
+            cur.execute(f"DROP TABLE {name}")
+            dropped.append(name)
+        cur.execute(
+            f"DELETE FROM {DEFAULT_PARTITION} WHERE ts < %s AND id <= %s", [_bounds(cutoff)[0], watermark]
+        )
+    return created, dropped
@@ -0,0 +1,136 @@
+# polls/ranking.py
+"""
+Materialized feed ranking.
+
+The feed score of a poll is
+
+    W_TREND * ln(1 + votes) + W_FRESH * exp(-age_hours / 24)
+
+and is stored in Poll.rank_score so the anonymous feed is an index range scan
+on (visibility, -rank_score, -created_at, -id) instead of scoring every public
+poll per request. `refresh` recomputes scores in SQL for given polls;
+`refresh_due` picks the polls whose stored score is stale:
+
+  - polls whose vote total changed since their score was computed,
+  - young polls (freshness moves fast) on every run,
+  - polls under a week old every FRESH_INTERVAL,
+  - everything else (and never-scored polls) every STALE_INTERVAL; after a week
+    the freshness term is below 0.001, so old scores barely move.
+
+New scores are pushed to the Redis feed sets (polls/feeds.py).
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+from django.db.models import DateTimeField, F, FloatField, Func, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Exp, Ln
+from django.utils import timezone
+
+from polls import feeds
+from polls.models import Poll, PollStats
+
+W_TREND = 0.6
+W_FRESH = 0.4
+
+YOUNG_AGE = timedelta(hours=48)
+FRESH_AGE = timedelta(days=7)
+FRESH_INTERVAL = timedelta(minutes=15)
+STALE_INTERVAL = timedelta(days=1)
+# PollStats rows touched within this window are checked for vote changes.
+VOTES_LOOKBACK = timedelta(minutes=5)
+UPDATE_CHUNK = 1000
+
+
+class AgeSeconds(Func):
+    """
+    Seconds from the `created_at` column to `now`. Extract(..., "epoch") of a datetime difference
+    needs native duration support, which SQLite lacks; there the age comes from julianday().
+    """
+    template = "EXTRACT(EPOCH FROM (%(expressions)s))"
+    arg_joiner = " - "
+    output_field = FloatField()
+
+    def __init__(self, now: datetime, field: str = "created_at"):
+        super().__init__(Value(now, output_field=DateTimeField()), F(field))
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template="((julianday(%(expressions)s)) * 86400.0)",
+            arg_joiner=") - julianday(",
+            **extra_context,
+        )
+
+
+def score_expression(now: datetime, votes=None):
+    """SQL expression of the feed score at `now` (votes default to the stats subquery)."""
+    if votes is None:
+        votes = _votes_subquery()
+    age_hours = Cast(AgeSeconds(now), FloatField()) / Value(3600.0)
+    fresh = Exp(-age_hours / Value(24.0))
+    trend = Ln(Value(1.0) + Cast(votes, FloatField()))
+    return Value(W_TREND) * trend + Value(W_FRESH) * fresh
+
+
+def _votes_subquery():
+    return Coalesce(
+        Subquery(PollStats.objects.filter(poll_id=OuterRef("pk")).values("total_votes")[:1]),
+        Value(0),
+    )
+
+
+def refresh(poll_ids: Iterable[int], now: Optional[datetime] = None) -> int:
+    """Recompute rank_score of the given polls with one UPDATE per chunk. Returns the row count."""
+    now = now or timezone.now()
+    ids = list(poll_ids)
+    updated = 0
+    for i in range(0, len(ids), UPDATE_CHUNK):
+        votes = _votes_subquery()
+        updated += Poll.objects.filter(pk__in=ids[i:i + UPDATE_CHUNK]).update(
+            rank_score=score_expression(now, votes),
+            rank_votes=votes,
+            rank_updated_at=now,
+        )
+    feeds.update(ids)
+    return updated
+
+
+def due_poll_ids(now: datetime, limit: int) -> List[int]:
+    """Ids of polls whose stored score is stale, most urgent first, at most `limit`."""
+    picked: dict = {}
+
+    def take(ids) -> None:
+        for pid in ids:
+            if len(picked) >= limit:
+                return
+            picked.setdefault(pid, None)
+
+    take(
+        PollStats.objects.filter(updated_at__gte=now - VOTES_LOOKBACK)
+        .exclude(total_votes=F("poll__rank_votes"))
+        .values_list("poll_id", flat=True)[:limit]
+    )
+    take(Poll.objects.filter(created_at__gte=now - YOUNG_AGE).values_list("id", flat=True)[:limit])
+    take(
+        Poll.objects.filter(
+            created_at__gte=now - FRESH_AGE,
+            created_at__lt=now - YOUNG_AGE,
+            rank_updated_at__lt=now - FRESH_INTERVAL,
+        ).values_list("id", flat=True)[:limit]
+    )
+    take(
+        Poll.objects.filter(Q(rank_updated_at__isnull=True) | Q(rank_updated_at__lt=now - STALE_INTERVAL))
+        .order_by(F("rank_updated_at").asc(nulls_first=True))
+        .values_list("id", flat=True)[:limit]
+    )
+    return list(picked)
+
+
+def refresh_due(limit: Optional[int] = None) -> int:
+    """Refresh up to RANK_REFRESH_BATCH stale scores. Returns the number of polls updated."""
+    limit = limit or getattr(settings, "RANK_REFRESH_BATCH", 5000)
+    now = timezone.now()
+    return refresh(due_poll_ids(now, limit), now=now)
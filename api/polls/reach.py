@@ -0,0 +1,126 @@
+# polls/reach.py
+"""
+Unique-viewer (reach) estimates with Redis HyperLogLogs.
+
+Every poll has an all-time HLL `polls:reach:{poll_id}` and one per UTC day,
+`polls:reach:{poll_id}:{YYYYMMDD}`. View events PFADD the viewer (a SHA-256 of
+the device id, as stored elsewhere for devices) into both; events without a
+device are not counted. PFCOUNT over several daily keys merges them, so unique
+viewers over any date range cost one command and ~12KB per key regardless of
+traffic. `persist` copies the all-time estimates into PollStats.unique_viewers.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from django.utils import timezone
+
+from polls.models import PollStats
+from lib.redis.pubsub import get_redis
+from lib.utils.network import sha256_hex
+
+logger = logging.getLogger(__name__)
+
+REACH_KEY_FMT = "polls:reach:{poll_id}"
+DIRTY_KEY = "polls:reach:dirty"
+# Daily HLLs bound how far back date-range reach can be asked for.
+DAY_TTL = 60 * 60 * 24 * 90
+MAX_RANGE_DAYS = 90
+
+
+def reach_key(poll_id: int, day: Optional[date] = None) -> str:
+    key = REACH_KEY_FMT.format(poll_id=poll_id)
+    return f"{key}:{day:%Y%m%d}" if day else key
+
+
+def _viewer(event: dict) -> Optional[str]:
+    # Collection is unauthenticated, so the device is the only viewer identity.
+    if event.get("device_id"):
+        return f"d:{sha256_hex(event['device_id'])}"
+    return None
+
+
+def queue_record(pipe, events: Iterable[dict], day: Optional[date] = None) -> bool:
+    """
+    Queue PFADDs for the viewers of view events (dicts with kind, poll_id, device_id) on a pipeline, so callers can share its round trip. Returns False if none.
+    """
+    viewers: Dict[int, set] = {}
+    for e in events:
+        viewer = _viewer(e)
+        if e.get("kind") == "view" and viewer:
+            viewers.setdefault(e["poll_id"], set()).add(viewer)
+    if not viewers:
+        return False
+    day = day or timezone.now().date()
+    for poll_id, members in viewers.items():
+        pipe.pfadd(reach_key(poll_id), *members)
+        pipe.pfadd(reach_key(poll_id, day), *members)
+        pipe.expire(reach_key(poll_id, day), DAY_TTL)
+    pipe.sadd(DIRTY_KEY, *viewers)
+    return True
+
+
+def record(events: Iterable[dict], day: Optional[date] = None) -> None:
+    """PFADD the viewers of view events in one round trip; failures are logged and ignored."""
+    r = get_redis()
+    if r is None:
+        return
+    try:
+        pipe = r.pipeline(transaction=False)
+        if queue_record(pipe, events, day):
+            pipe.execute()
+    except Exception:
+        logger.warning("reach: pfadd failed")
+
+
+def unique_viewers(poll_ids: List[int], start: Optional[date] = None, end: Optional[date] = None) -> Dict[int, int]:
+    """
+    {poll_id: estimated unique viewers}, all-time or over the UTC days [start, end]
+    (merged daily HLLs, at most MAX_RANGE_DAYS). Polls are answered in one pipeline.
+    """
+    if not poll_ids:
+        return {}
+    r = get_redis()
+    if r is None:
+        return {}
+    days = []
+    if start or end:
+        end = end or timezone.now().date()
+        start = max(start or end, end - timedelta(days=MAX_RANGE_DAYS - 1))
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        if not days:
+            return {pid: 0 for pid in poll_ids}
+    try:
+        pipe = r.pipeline(transaction=False)
+        for poll_id in poll_ids:
+            if days:
+                pipe.pfcount(*[reach_key(poll_id, d) for d in days])
+            else:
+                pipe.pfcount(reach_key(poll_id))
+        return dict(zip(poll_ids, (int(n) for n in pipe.execute())))
+    except Exception:
+        logger.warning("reach: pfcount failed for %d polls", len(poll_ids))
+        return {}
+
+
+def persist(batch_size: int = 1000) -> int:
+    """Write all-time estimates of polls with new views into PollStats.unique_viewers."""
+    r = get_redis()
+    if r is None:
+        return 0
+    try:
+        poll_ids = [int(pid) for pid in (r.spop(DIRTY_KEY, batch_size) or [])]
+    except Exception:
+        logger.warning("reach: reading dirty polls failed")
+        return 0
+    estimates = unique_viewers(poll_ids)
+    if not estimates:
+        return 0
+    PollStats.objects.bulk_create([PollStats(poll_id=pid) for pid in estimates], ignore_conflicts=True)
+    stats = list(PollStats.objects.filter(poll_id__in=list(estimates)).only("id", "poll_id", "unique_viewers"))
+    for s in stats:
+        s.unique_viewers = estimates[s.poll_id]
+    PollStats.objects.bulk_update(stats, ["unique_viewers"])
+    return len(stats)
@@ -0,0 +1,195 @@
+# polls/rollups.py
+"""
+Time-bucketed rollups: votes per option (VoteRollup), other poll metrics
+(PollMetricRollup), and the poll timeline built from them.
+
+`rollup_votes` folds Vote rows after a persisted watermark (last rolled-up
+Vote.id) into minute, hour and day buckets with three GROUP BY queries and one
+upsert that adds to existing counts, so timeline reads never scan Vote.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from polls.models import AggregationWatermark, PollMetricRollup, Vote, VoteRollup
+
+VOTES_WATERMARK = "rollup_votes"
+GRANULARITIES = {
+    VoteRollup.Granularity.MINUTE: timedelta(minutes=1),
+    VoteRollup.Granularity.HOUR: timedelta(hours=1),
+    VoteRollup.Granularity.DAY: timedelta(days=1),
+}
+# Default window of a timeline request, and how long fine-grained buckets are kept.
+DEFAULT_WINDOW = {
+    VoteRollup.Granularity.MINUTE: timedelta(hours=6),
+    VoteRollup.Granularity.HOUR: timedelta(days=7),
+    VoteRollup.Granularity.DAY: timedelta(days=365),
+}
+RETENTION = {
+    VoteRollup.Granularity.MINUTE: timedelta(days=7),
+    VoteRollup.Granularity.HOUR: timedelta(days=365),
+}
+MAX_BUCKETS = 2000
+
+_UPSERT_SQL = """
+INSERT INTO {table} ({columns})
+VALUES {values}
+ON CONFLICT ({conflict})
+DO UPDATE SET {value_col} = {table}.{value_col} + EXCLUDED.{value_col}
+"""
+
+
+def _upsert_increment(model, columns: Tuple[str, ...], conflict: Tuple[str, ...], rows: List[tuple]) -> None:
+    """
+    Add the last column of each row (ordered as `columns`) to the matching row of `model`,
+    inserting it when missing. One INSERT ... ON CONFLICT DO UPDATE per 1000 rows on PostgreSQL.
+    """
+    if not rows:
+        return
+    value_col = columns[-1]
+    if connection.vendor == "postgresql":
+        table = connection.ops.quote_name(model._meta.db_table)
+        placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        for i in range(0, len(rows), 1000):
+            chunk = rows[i:i + 1000]
+            with connection.cursor() as cur:
+                cur.execute(
+                    _UPSERT_SQL.format(
+                        table=table,
+                        columns=", ".join(columns),
+                        values=", ".join([placeholders] * len(chunk)),
+                        conflict=", ".join(conflict),
+                        value_col=value_col,
+                    ),
+                    [x for row in chunk for x in row],
+                )
+        return
+    for row in rows:
+        obj, _ = model.objects.get_or_create(**dict(zip(columns[:-1], row[:-1])))
+        model.objects.filter(pk=obj.pk).update(**{value_col: F(value_col) + row[-1]})
+
+
+def _add_counts(rows: List[Tuple[int, int, str, datetime, int]]) -> None:
+    """count += n for each (poll_id, option_id, granularity, bucket_start, n)."""
+    _upsert_increment(
+        VoteRollup,
+        ("poll_id", "option_id", "granularity", "bucket_start", "count"),
+        ("poll_id", "granularity", "bucket_start", "option_id"),
+        rows,
+    )
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    """Start of the UTC hour/day/week (Monday)/month bucket containing `ts`."""
+    ts = ts.astimezone(dt_timezone.utc)
+    if granularity == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def add_metrics(deltas: Dict[Tuple[int, str], int], ts: Optional[datetime] = None) -> None:
+    """Add {(poll_id, metric): delta} to the hour and day PollMetricRollup buckets of `ts` (default now)."""
+    ts = ts or timezone.now()
+    add_metric_rows([(pid, metric, ts, delta) for (pid, metric), delta in deltas.items()])
+
+
+def add_metric_rows(rows: List[Tuple[int, str, datetime, int]]) -> None:
+    """Add (poll_id, metric, ts, delta) rows to their hour and day PollMetricRollup buckets."""
+    totals: Dict[tuple, int] = {}
+    for poll_id, metric, ts, delta in rows:
+        if not delta:
+            continue
+        for granularity in PollMetricRollup.Granularity.values:
+            key = (poll_id, metric, granularity, bucket_start(ts, granularity))
+            totals[key] = totals.get(key, 0) + delta
+    _upsert_increment(
+        PollMetricRollup,
+        ("poll_id", "metric", "granularity", "bucket_start", "value"),
+        ("poll_id", "metric", "granularity", "bucket_start"),
+        [(*key, value) for key, value in totals.items()],
+    )
+
+
+def rollup_votes(max_votes: Optional[int] = None) -> int:
+    """
+    Add votes after the watermark to their minute/hour/day buckets, exactly once, and expire
+    old fine-grained buckets. Returns the number of votes rolled up.
+    """
+    max_votes = max_votes or getattr(settings, "VOTE_ROLLUP_MAX_VOTES", 100_000)
+    settled = timezone.now() - timedelta(seconds=getattr(settings, "EVENT_AGG_SETTLE_SECONDS", 10))
+
+    with transaction.atomic():
+        AggregationWatermark.objects.get_or_create(name=VOTES_WATERMARK)
+        mark = AggregationWatermark.objects.select_for_update().get(name=VOTES_WATERMARK)
+        pending = Vote.objects.filter(id__gt=mark.last_event_id, created_at__lt=settled).order_by("id")
+        last_id = pending.values_list("id", flat=True)[max_votes - 1:max_votes].first()
+        if last_id is None:
+            last_id = pending.values_list("id", flat=True).last()
+        if last_id is None:
+            return 0
+
+        batch = Vote.objects.filter(id__gt=mark.last_event_id, id__lte=last_id)
+        rows = []
+        for granularity in GRANULARITIES:
+            grouped = (
+                batch.annotate(bucket=Trunc("created_at", granularity, tzinfo=dt_timezone.utc))
+                .values("poll_id", "option_id", "bucket")
+                .annotate(n=Count("id"))
+                .order_by()
+            )
+            rows += [(g["poll_id"], g["option_id"], granularity, g["bucket"], g["n"]) for g in grouped]
+        _add_counts(rows)
+        rolled = sum(n for _, _, granularity, _, n in rows if granularity == VoteRollup.Granularity.DAY)
+
+        mark.last_event_id = last_id
+        mark.save(update_fields=["last_event_id", "updated_at"])
+
+    now = timezone.now()
+    for granularity, keep in RETENTION.items():
+        VoteRollup.objects.filter(granularity=granularity, bucket_start__lt=now - keep).delete()
+    return rolled
+
+
+def timeline(
+    poll_id: int,
+    granularity: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> List[Dict]:
+    """
+    [{"t": bucket_start, "total": n, "counts": {option_id: n}}] for the buckets of
+    [start, end) that have votes, oldest first. Votes from the last few seconds may
+    not be rolled up yet.
+    """
+    step = GRANULARITIES[granularity]
+    end = end or timezone.now()
+    start = start or end - DEFAULT_WINDOW[granularity]
+    start = max(start, end - step * MAX_BUCKETS)
+
+    buckets: Dict[datetime, Dict] = {}
+    rows = (
+        VoteRollup.objects.filter(
+            poll_id=poll_id, granularity=granularity, bucket_start__gte=start, bucket_start__lt=end
+        )
+        .order_by("bucket_start")
+        .values_list("bucket_start", "option_id", "count")
+    )
+    for bucket_start, option_id, count in rows:
+        b = buckets.setdefault(bucket_start, {"t": bucket_start, "total": 0, "counts": {}})
+        b["counts"][option_id] = count
+        b["total"] += count
+    return list(buckets.values())
@@ -0,0 +1,55 @@
+# polls/sampling.py
+"""
+Server-side sampling of high-volume analytics events.
+
+EVENT_SAMPLE_RATES maps an event kind to a rate in (0, 1]. A rate is rounded to
+1-in-N, and an event is kept when a hash of (poll, device) falls in the kept
+1/N of the hash space, so a viewer is consistently in or out of the sample for
+a poll. Kept events carry weight N and dropped ones weight 0; counters and
+aggregates sum weights, which gives unbiased estimates of the full totals.
+N is capped at MAX_WEIGHT, the largest value Event.weight (a small integer) holds;
+rates below 1/MAX_WEIGHT sample at 1/MAX_WEIGHT.
+
+Votes and shares are never sampled.
+"""
+from __future__ import annotations
+
+import random
+import zlib
+from typing import Iterable, List
+
+from django.conf import settings
+
+UNSAMPLED_KINDS = frozenset({"vote", "share"})
+# Upper bound of Event.weight (PositiveSmallIntegerField).
+MAX_WEIGHT = 32767
+
+
+def weight_for(kind: str) -> int:
+    """N for a 1-in-N sample of `kind` (1 = keep everything)."""
+    if kind in UNSAMPLED_KINDS:
+        return 1
+    rate = getattr(settings, "EVENT_SAMPLE_RATES", {}).get(kind, 1.0)
+    if rate >= 1:
+        return 1
+    if rate <= 0:
+        return 0
+    return min(MAX_WEIGHT, max(1, round(1 / rate)))
+
+
+def is_kept(poll_id: int, device_id: str, n: int) -> bool:
+    """Whether (poll, device) is in the 1-in-n sample. Events without a device are kept at random."""
+    if n <= 1:
+        return n == 1
+    if not device_id:
+        return random.randrange(n) == 0
+    return zlib.crc32(f"{poll_id}:{device_id}".encode("utf-8")) % n == 0
+
+
+def apply(events: Iterable[dict]) -> List[dict]:
+    """Set `weight` on each event dict: N if kept in its kind's 1-in-N sample, else 0."""
+    events = list(events)
+    for e in events:
+        n = weight_for(e["kind"])
+        e["weight"] = n if is_kept(e["poll_id"], e.get("device_id", ""), n) else 0
+    return events
@@ -8,10 +8,10 @@ from polls.models import (
     PollOption,
     PollStats,
     ResultsMode,
-    Vote,
     Topic,
     PollTopic,
 )
+from polls.voting import find_user_vote, find_user_votes
 from lib.utils.network import sha256_hex
 
 
@@ -33,6 +33,14 @@ class TopicSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "slug")
 
 
+def _viewer(request):
+    """(user, device_hash) of the request's viewer; either may be None."""
+    user = getattr(request, "user", None)
+    user = user if user and user.is_authenticated else None
+    device_id = request.headers.get("X-Device-Id")
+    return user, sha256_hex(device_id) if device_id else None
+
+
 class PollBaseSerializer(serializers.ModelSerializer):
     """
     Read serializer for a poll with options, stats, topics and user vote context.
@@ -94,27 +102,40 @@ class PollBaseSerializer(serializers.ModelSerializer):
             return self.get_user_vote(obj) is not None
         return False
 
+    @staticmethod
+    def user_votes_for(request, polls) -> dict:
+        """
+        Resolve the viewer's votes on a page of polls at once, for the `user_votes` context
+        of a list serializer: {poll_id: option_id}.
+        """
+        user, device_hash = _viewer(request)
+        return find_user_votes([p.pk for p in polls], user=user, device_hash=device_hash)
+
     def get_user_vote(self, obj: Poll):
         """
         Return the option ID voted by the current user or device (if any).
+        List views pass the page's votes in the `user_votes` context (see user_votes_for);
+        otherwise served by the per-poll voter registry, memoized per serializer instance
+        since get_results_available asks for the same poll.
         """
         request = self.context.get("request")
         if not request:
             return None
 
-        user = getattr(request, "user", None)
-        if user and user.is_authenticated:
-            vote = Vote.objects.filter(poll=obj, user=user).only("option_id").first()
-            if vote:
-                return vote.option_id
+        user_votes = self.context.get("user_votes")
+        if user_votes is not None:
+            return user_votes.get(obj.pk)
+
+        memo = self.__dict__.setdefault("_user_votes", {})
+        if obj.pk in memo:
+            return memo[obj.pk]
 
-        device_id = request.headers.get("X-Device-Id")
-        if not device_id:
+        user, device_hash = _viewer(request)
+        if not user and not device_hash:
             return None
 
-        device_hash = sha256_hex(device_id)
-        vote = Vote.objects.filter(poll=obj, device_hash=device_hash).only("option_id").first()
-        return vote.option_id if vote else None
+        memo[obj.pk] = find_user_vote(obj.pk, user=user, device_hash=device_hash)
+        return memo[obj.pk]
 
     def get_author(self, obj: Poll):
         """
@@ -143,11 +164,14 @@ class PollDetailSerializer(PollBaseSerializer):
         if not available:
             return None
         stats = getattr(obj, "stats", None)
-        if not stats or not stats.option_counts:
+        if not stats:
+            return {}
+        option_counts, total = stats.live_counts()
+        if not option_counts:
             return {}
-        total = max(1, stats.total_votes)
+        total = max(1, total)
         # Keys in option_counts are stored as strings; cast to int for API
         return {
             int(option_id): round((count / total) * 100, 2)
-            for option_id, count in {int(k): v for k, v in stats.option_counts.items()}.items()
+            for option_id, count in {int(k): v for k, v in option_counts.items()}.items()
         }
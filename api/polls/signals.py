@@ -1,11 +1,11 @@
-from collections import Counter
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from django.db.models import Count
+from django.db import transaction
 
-from polls.models import Vote, Poll, PollStats, UserProfile
-from lib.redis.pubsub import publish_poll_update
+from polls import counters as vote_counters
+from polls import feeds, guards, interests, timelines, voters
+from polls.models import FollowAuthor, FollowTopic, Vote, Poll, PollOption, PollStats, UserProfile
 
 User = get_user_model()
 
@@ -19,41 +19,64 @@ def create_profile_and_nick(sender, instance, created, **kwargs):
             profile.save()
 
 
-@receiver(post_save, sender=Vote)
-def vote_created(sender, instance: Vote, created: bool, **kwargs):
-    """Publish live poll update (SSE) whenever a new vote is created."""
-    if not created:
-        return
-    poll = instance.poll
-    agg = Vote.objects.filter(poll=poll).values('option_id').annotate(c=Count('id'))
-    counts = {row['option_id']: row['c'] for row in agg}
-    total = sum(counts.values()) or 0
-    percents = {opt: round((c / total) * 100, 2) if total else 0.0 for opt, c in counts.items()}
-
-    publish_poll_update(poll.id, {
-        "poll_id": poll.id,
-        "counts": counts,
-        "percents": percents,
-        "total_votes": total,
-    })
-
-
-def _recalc_stats(poll_id: int):
-    """Recalculate PollStats table after votes are created or deleted."""
-    counts = Counter(Vote.objects.filter(poll_id=poll_id).values_list("option_id", flat=True))
-    total = sum(counts.values())
-    stats, _ = PollStats.objects.get_or_create(poll_id=poll_id)
-    stats.option_counts = {str(k): v for k, v in counts.items()}
-    stats.total_votes = total
-    stats.save(update_fields=["option_counts", "total_votes", "updated_at"])
-
-
-@receiver(post_save, sender=Vote)
-def on_vote_created(sender, instance: Vote, created, **kwargs):
-    if created:
-        _recalc_stats(instance.poll_id)
-
-
 @receiver(post_delete, sender=Vote)
 def on_vote_deleted(sender, instance: Vote, **kwargs):
-    _recalc_stats(instance.poll_id)
+    """Decrement PollStats in place (inserts are counted by polls.voting)."""
+    PollStats.apply_vote(instance.poll_id, instance.option_id, -1)
+    poll_id = instance.poll_id
+    fields = voters.identity_fields(
+        user_id=instance.user_id,
+        device_hash=instance.device_hash,
+        ip_hash=instance.ip_hash,
+        idempotency_key=instance.idempotency_key,
+    )
+
+    def _after_commit():
+        vote_counters.invalidate(poll_id)
+        voters.forget(poll_id, fields.values())
+
+    transaction.on_commit(_after_commit)
+
+
+@receiver(post_save, sender=Poll)
+@receiver(post_delete, sender=Poll)
+def on_poll_changed(sender, instance: Poll, **kwargs):
+    """
+    Once committed, evict cached vote guards (moderation flags, close time) in every worker
+    and add, re-score or remove the poll in the Redis feeds.
+    """
+    poll_id = instance.pk
+
+    def _after_commit():
+        guards.invalidate(poll_id)
+        feeds.update([poll_id])
+
+    transaction.on_commit(_after_commit)
+
+
+@receiver(post_save, sender=PollOption)
+@receiver(post_delete, sender=PollOption)
+def on_poll_option_changed(sender, instance: PollOption, **kwargs):
+    poll_id = instance.poll_id
+    transaction.on_commit(lambda: guards.invalidate(poll_id))
+
+
+@receiver(post_save, sender=FollowAuthor)
+@receiver(post_delete, sender=FollowAuthor)
+def on_follow_author_changed(sender, instance: FollowAuthor, **kwargs):
+    """Drop the follower's cached interests and following timeline so the next read rebuilds them."""
+    user_id = instance.user_id
+
+    def _after_commit():
+        interests.invalidate(user_id)
+        timelines.invalidate(user_id)
+
+    transaction.on_commit(_after_commit)
+
+
+@receiver(post_save, sender=FollowTopic)
+@receiver(post_delete, sender=FollowTopic)
+def on_follow_topic_changed(sender, instance: FollowTopic, **kwargs):
+    """Drop the follower's cached interests so the next feed request reloads them."""
+    user_id = instance.user_id
+    transaction.on_commit(lambda: interests.invalidate(user_id))
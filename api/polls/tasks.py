@@ -1,30 +1,183 @@
 from celery import shared_task
-from django.db.models import Sum, Count, Avg
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
 from django.utils import timezone
-from polls.models import Event, PollAgg
+from polls import counters as vote_counters
+from polls import aggregation, partitions, ranking, rollups
+from polls.models import AggregationWatermark, Event, Poll, PollStats, PollStatsShard, Vote
+
+RECONCILE_CURSOR_KEY = 'polls:stats:reconcile:cursor'
+EVENTS_WATERMARK = partitions.EVENTS_WATERMARK
 
 
 @shared_task(name='polls.tasks.aggregate_events')
-def aggregate_events():
+def aggregate_events(max_events=None, max_batches=None):
+    """
+    Fold new Event rows into PollAgg, exactly once.
+
+    Reads events after the persisted watermark (last processed Event.id) in id order and
+    writes all touched rows with bulk upserts; the watermark moves in the same transaction.
+    A batch stops at the first event younger than EVENT_AGG_SETTLE_SECONDS, so the watermark
+    only moves over a settled run of ids and rows from still-open transactions (lower ids
+    committed late) are not skipped. A backlog is worked
+    off in up to EVENT_AGG_MAX_BATCHES batches per run (see polls.aggregation for engines).
+    """
     from datetime import timedelta
-    since = timezone.now() - timedelta(minutes=30)
-    qs = Event.objects.filter(ts__gte=since)
-    if not qs.exists():
+    max_events = max_events or getattr(settings, 'EVENT_AGG_MAX_EVENTS', 100_000)
+    max_batches = max_batches or getattr(settings, 'EVENT_AGG_MAX_BATCHES', 20)
+    now = timezone.now()
+    settled = now - timedelta(seconds=getattr(settings, 'EVENT_AGG_SETTLE_SECONDS', 10))
+
+    total = polls = 0
+    last_id = None
+    for _ in range(max_batches):
+        with transaction.atomic():
+            AggregationWatermark.objects.get_or_create(name=EVENTS_WATERMARK)
+            mark = AggregationWatermark.objects.select_for_update().get(name=EVENTS_WATERMARK)
+            batch = aggregation.fold_events(mark.last_event_id, settled, max_events)
+            if not batch.count:
+                break
+            aggregation.write_batch(batch, now)
+            mark.last_event_id = last_id = batch.last_id
+            mark.save(update_fields=['last_event_id', 'updated_at'])
+        total += batch.count
+        polls += len(batch.polls)
+        if batch.count < max_events:
+            break
+    if last_id is None:
         return 'no events'
-    data = {}
-    for e in qs.values('poll_id','kind').annotate(c=Count('id'), dwell_sum=Sum('dwell_ms')):
-        key = e['poll_id']
-        rec = data.setdefault(key, {'view':0,'vote':0,'share':0,'dwell_sum':0})
-        rec[e['kind']] = e['c']
-        if e['kind'] == 'dwell':
-            rec['dwell_sum'] = e['dwell_sum'] or 0
-    for poll_id, rec in data.items():
-        agg, _ = PollAgg.objects.get_or_create(poll_id=poll_id)
-        agg.views += rec.get('view',0)
-        agg.votes += rec.get('vote',0)
-        agg.shares += rec.get('share',0)
-        agg.dwell_ms_sum += rec.get('dwell_sum',0)
-        agg.dwell_ms_avg = int((agg.dwell_ms_sum / max(agg.views,1)))
-        agg.save()
-    Event.objects.filter(ts__lt=since).delete()
-    return f'aggregated {len(data)} polls'
+
+    # Raw events are only kept for a short window once they are aggregated. A partitioned
+    # Event table expires whole days in maintain_event_partitions instead.
+    if not partitions.is_partitioned():
+        Event.objects.filter(id__lte=last_id, ts__lt=now - timedelta(minutes=30)).delete()
+    return f'aggregated {total} events of {polls} polls up to event {last_id}'
+
+
+@shared_task(name='polls.tasks.flush_event_buffer')
+def flush_event_buffer(batch_size=None):
+    """Bulk-insert analytics events buffered by /analytics/collect*."""
+    from polls import event_buffer
+    inserted = event_buffer.flush(batch_size=batch_size)
+    return f'flushed {inserted} events'
+
+
+@shared_task(name='polls.tasks.rollup_votes')
+def rollup_votes(max_votes=None):
+    """Fold new votes into per-minute/hour/day VoteRollup buckets."""
+    rolled = rollups.rollup_votes(max_votes=max_votes)
+    return f'rolled up {rolled} votes'
+
+
+@shared_task(name='polls.tasks.refresh_rank_scores')
+def refresh_rank_scores(limit=None):
+    """Recompute the materialized feed score of polls whose score is stale."""
+    refreshed = ranking.refresh_due(limit=limit)
+    return f'refreshed rank scores of {refreshed} polls'
+
+
+@shared_task(name='polls.tasks.rebuild_feeds')
+def rebuild_feeds():
+    """Recreate the Redis hot and topic feed sets from Poll.rank_score."""
+    from polls import feeds
+    built = feeds.rebuild()
+    return f'rebuilt {built} feeds'
+
+
+@shared_task(name='polls.tasks.fan_out_poll')
+def fan_out_poll(poll_id):
+    """Push a new poll into the following timelines of its author's followers."""
+    from polls import timelines
+    written = timelines.fan_out(poll_id)
+    return f'poll {poll_id} pushed to {written} timelines'
+
+
+@shared_task(name='polls.tasks.flush_view_counts')
+def flush_view_counts():
+    """Add Redis view counter deltas to PollStats.views and PollAgg.views."""
+    from polls import view_counts
+    flushed = view_counts.flush()
+    return f'flushed views of {flushed} polls'
+
+
+@shared_task(name='polls.tasks.persist_unique_viewers')
+def persist_unique_viewers():
+    """Copy HyperLogLog reach estimates of recently viewed polls into PollStats.unique_viewers."""
+    from polls import reach
+    updated = reach.persist()
+    return f'unique viewers updated for {updated} polls'
+
+
+@shared_task(name='polls.tasks.maintain_event_partitions')
+def maintain_event_partitions():
+    """Create upcoming daily Event partitions and drop expired ones."""
+    created, dropped = partitions.maintain()
+    return f'event partitions: {len(created)} created, {len(dropped)} dropped'
+
+
+@shared_task(name='polls.tasks.reconcile_poll_stats')
+def reconcile_poll_stats(batch_size=None):
+    """
+    Repair PollStats drift against the Vote table, one bounded batch of polls per run.
+    Walks poll ids with a cursor kept in the cache and wraps around at the end.
+    """
+    batch_size = batch_size or getattr(settings, 'POLL_STATS_RECONCILE_BATCH', 500)
+    cursor = cache.get(RECONCILE_CURSOR_KEY) or 0
+    poll_ids = list(
+        Poll.objects.filter(id__gt=cursor).order_by('id').values_list('id', flat=True)[:batch_size]
+    )
+    if not poll_ids:
+        cache.set(RECONCILE_CURSOR_KEY, 0, timeout=None)
+        return 'reconcile: wrapped'
+
+    with transaction.atomic():
+        # Lock the stats rows before counting: a concurrent vote either committed before the
+        # count (and is included) or waits on the lock and increments the repaired row after.
+        # Pending shard deltas are covered by the recount, so they are zeroed (shards first,
+        # same lock order as fold_poll_stats_shards).
+        PollStatsShard.drain(poll_ids, skip_locked=False)
+        stats = {s.poll_id: s for s in PollStats.objects.select_for_update().filter(poll_id__in=poll_ids)}
+        actual = {pid: {} for pid in poll_ids}
+        rows = Vote.objects.filter(poll_id__in=poll_ids).values('poll_id', 'option_id').annotate(c=Count('id'))
+        for row in rows:
+            actual[row['poll_id']][str(row['option_id'])] = row['c']
+
+        to_create, to_update = [], []
+        for pid, counts in actual.items():
+            total = sum(counts.values())
+            current = stats.get(pid)
+            if current is None:
+                to_create.append(PollStats(poll_id=pid, option_counts=counts, total_votes=total))
+            elif current.total_votes != total or (current.option_counts or {}) != counts:
+                current.option_counts = counts
+                current.total_votes = total
+                current.updated_at = timezone.now()
+                to_update.append(current)
+
+        PollStats.objects.bulk_create(to_create, ignore_conflicts=True)
+        PollStats.objects.bulk_update(to_update, ['option_counts', 'total_votes', 'updated_at'])
+    for s in to_update:
+        vote_counters.invalidate(s.poll_id)
+
+    cache.set(RECONCILE_CURSOR_KEY, poll_ids[-1], timeout=None)
+    return f'reconciled {len(poll_ids)} polls: {len(to_update)} fixed, {len(to_create)} created'
+
+
+@shared_task(name='polls.tasks.fold_poll_stats_shards')
+def fold_poll_stats_shards():
+    """Move pending PollStatsShard deltas into PollStats (see POLL_STATS_SHARDS)."""
+    with transaction.atomic():
+        folded = PollStats.fold_shards()
+    if not folded:
+        return 'no pending shard deltas'
+    return f'folded shard deltas of {folded} polls'
+
+
+@shared_task(name='polls.tasks.drain_vote_stream')
+def drain_vote_stream(batch_size=None):
+    """Persist votes accepted in write-behind mode (VOTE_INGEST_MODE = 'stream')."""
+    from polls.voting import drain_vote_stream as drain
+    inserted = drain(batch_size=batch_size)
+    return f'persisted {inserted} votes'
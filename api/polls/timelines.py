@@ -0,0 +1,175 @@
+# polls/timelines.py
+"""
+"Following" home timelines: new polls of the authors a user follows, newest first.
+
+Fan-out on write: when a poll is published, the fan_out_poll task adds its id to
+the sorted set `timelines:following:{user_id}` of every follower (score = poll
+id, so the order is creation order), in batches over FollowAuthor. Sets are
+capped at TIMELINE_SIZE and only updated if they exist; a missing set is built
+from SQL on the next read, so inactive users cost no memory.
+
+Authors with more than TIMELINE_FANOUT_MAX_FOLLOWERS followers are not fanned
+out. They are kept in the set `timelines:fanout-on-read`, and their recent polls
+are merged into each page at read time instead.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+
+from polls import feeds
+from polls.models import FollowAuthor
+from lib.redis.pubsub import get_redis
+
+logger = logging.getLogger(__name__)
+
+TIMELINE_KEY_FMT = "timelines:following:{user_id}"
+FANOUT_ON_READ_KEY = "timelines:fanout-on-read"
+# Timelines of users who stop reading expire; the next read rebuilds them.
+TIMELINE_TTL = 60 * 60 * 24 * 7
+FANOUT_BATCH = 1000
+
+# Add a poll to a timeline only if it exists, then trim it to the cap.
+# KEYS[1]: timeline; ARGV: poll_id, cap
+_PUSH_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+  redis.call('ZADD', KEYS[1], ARGV[1], ARGV[1])
+  redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -(tonumber(ARGV[2]) + 1))
+  return 1
+end
+return 0
+"""
+
+_push_script = None
+
+
+def timeline_key(user_id: int) -> str:
+    return TIMELINE_KEY_FMT.format(user_id=user_id)
+
+
+def timeline_size() -> int:
+    return getattr(settings, "TIMELINE_SIZE", 500)
+
+
+def fanout_max_followers() -> int:
+    return getattr(settings, "TIMELINE_FANOUT_MAX_FOLLOWERS", 10_000)
+
+
+def fan_out(poll_id: int) -> int:
+    """
+    Push a published poll into its author's followers' timelines. Returns the number of
+    timelines written, or 0 if the poll is not in the feeds or its author is read-merged.
+    """
+    global _push_script
+    r = get_redis()
+    author_id = feeds.feed_polls().filter(pk=poll_id).values_list("author_id", flat=True).first()
+    if r is None or author_id is None:
+        return 0
+    followers = FollowAuthor.objects.filter(author_id=author_id)
+    if followers.count() > fanout_max_followers():
+        r.sadd(FANOUT_ON_READ_KEY, author_id)
+        return 0
+    r.srem(FANOUT_ON_READ_KEY, author_id)
+
+    if _push_script is None:
+        _push_script = r.register_script(_PUSH_LUA)
+    size = timeline_size()
+    written = 0
+    batch: List[int] = []
+    for user_id in followers.values_list("user_id", flat=True).iterator(chunk_size=FANOUT_BATCH):
+        batch.append(user_id)
+        if len(batch) >= FANOUT_BATCH:
+            written += _push(r, batch, poll_id, size)
+            batch = []
+    if batch:
+        written += _push(r, batch, poll_id, size)
+    return written
+
+
+def _push(r, user_ids: List[int], poll_id: int, size: int) -> int:
+    pipe = r.pipeline(transaction=False)
+    for user_id in user_ids:
+        _push_script(keys=[timeline_key(user_id)], args=[poll_id, size], client=pipe)
+    return sum(pipe.execute())
+
+
+def invalidate(user_id: int) -> None:
+    """Drop a user's timeline (after a follow change); the next read rebuilds it."""
+    r = get_redis()
+    if r is None:
+        return
+    try:
+        r.delete(timeline_key(user_id))
+    except Exception:
+        logger.warning("timelines: invalidate failed for user_id=%s", user_id)
+
+
+def _read_merged_authors(r, author_ids: List[int]) -> List[int]:
+    if not author_ids:
+        return []
+    flags = r.smismember(FANOUT_ON_READ_KEY, author_ids)
+    return [a for a, flag in zip(author_ids, flags) if flag]
+
+
+def _build(r, key: str, author_ids: Iterable[int]) -> None:
+    qs = feeds.feed_polls().filter(author_id__in=list(author_ids)).order_by("-id")
+    ids = list(qs.values_list("id", flat=True)[: timeline_size()])
+    pipe = r.pipeline(transaction=True)
+    pipe.delete(key)
+    if ids:
+        pipe.zadd(key, {pid: pid for pid in ids})
+    else:
+        # Placeholder member so an empty timeline still counts as built.
+        pipe.zadd(key, {0: 0})
+    pipe.expire(key, TIMELINE_TTL)
+    pipe.execute()
+
+
+def fetch(user_id: int, author_ids: Iterable[int], queryset, position: Optional[list], snapshot, limit: int):
+    """
+    Up to `limit` polls of `queryset` by followed `author_ids`, newest first, with ids below
+    the keyset `position` and created by `snapshot`: timeline ids merged with recent polls of
+    fan-out-on-read authors, hydrated in one `id__in` query. Returns None when Redis cannot
+    answer exactly; the caller then reads SQL.
+    """
+    r = get_redis()
+    author_ids = sorted(author_ids)
+    if r is None or not author_ids:
+        return None
+    key = timeline_key(user_id)
+    before = position[0] if position else None
+    want = 2 * limit
+    try:
+        merged_authors = _read_merged_authors(r, author_ids)
+        if not r.exists(key):
+            _build(r, key, set(author_ids) - set(merged_authors))
+        pipe = r.pipeline(transaction=False)
+        pipe.zrevrangebyscore(key, f"({before}" if before else "+inf", "(0", start=0, num=want)
+        pipe.zcard(key)
+        pipe.expire(key, TIMELINE_TTL)
+        raw, card, _ = pipe.execute()
+    except Exception:
+        logger.warning("timelines: read failed for user_id=%s", user_id)
+        return None
+
+    pushed = [int(m) for m in raw]
+    if len(pushed) < want and card >= timeline_size():
+        # Paged past the capped timeline.
+        return None
+    ids = set(pushed)
+    if merged_authors:
+        recent = feeds.feed_polls().filter(author_id__in=merged_authors)
+        if before:
+            recent = recent.filter(id__lt=before)
+        ids.update(recent.order_by("-id").values_list("id", flat=True)[:want])
+
+    polls = queryset.filter(pk__in=ids, author_id__in=author_ids, created_at__lte=snapshot)
+    rows = sorted(polls, key=lambda p: p.pk, reverse=True)
+    # With a full read, timeline members below the last one read are unknown: stop there.
+    floor = min(pushed) if len(pushed) == want else 0
+    rows = [p for p in rows if p.pk >= floor]
+    if len(rows) >= limit or len(pushed) < want:
+        return rows[:limit]
+    return None
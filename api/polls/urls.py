@@ -8,6 +8,7 @@ from polls.viewsets.comment import CommentViewSet
 from polls.viewsets.auth import AuthViewSet
 from polls.viewsets.profile import ProfileViewSet
 from polls.viewsets.author import AuthorViewSet
+from polls.viewsets.analytics import AnalyticsViewSet
 from polls.viewsets.moderation import ReportViewSet, ModerationViewSet  # из предыдущего шага
 
 from polls.views_stream import PollStreamView
@@ -22,6 +23,7 @@ router.register(r"comments", CommentViewSet, basename="comment")  # for /comment
 router.register(r"auth", AuthViewSet, basename="auth")
 router.register(r"profile", ProfileViewSet, basename="profile")
 router.register(r"author", AuthorViewSet, basename="author")
+router.register(r"analytics", AnalyticsViewSet, basename="analytics")
 router.register(r"moderation/reports", ReportViewSet, basename="moderation-reports")
 router.register(r"moderation", ModerationViewSet, basename="moderation")
 
@@ -0,0 +1,164 @@
+# polls/view_counts.py
+"""
+Poll view counters in Redis.
+
+A view is one HINCRBY on the pending hash `polls:views:pending` (field = poll id),
+sent in the same pipeline as the reach HyperLogLog PFADDs. `flush` swaps the hash
+out with RENAME and adds the deltas to PollStats.views and PollAgg.views with one
+UPDATE ... FROM (VALUES ...) per table (and to the hourly/daily PollMetricRollup
+buckets), so increments that arrive during a flush land in a fresh hash and none
+are lost.
+
+Flushes are exactly-once: one runs at a time under a Redis lock, and the swapped
+hash is stamped with a batch number that is recorded (AggregationWatermark
+"flush_view_counts") in the same transaction as the view updates. A hash whose
+batch is already recorded, left by a flush that crashed after its commit, is
+deleted instead of applied again.
+"""
+from __future__ import annotations
+
+import logging
+import secrets
+from typing import Dict, Iterable
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from polls import reach, rollups
+from polls.models import AggregationWatermark, Poll, PollAgg, PollStats
+from lib.redis.pubsub import get_redis
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "polls:views:pending"
+# A flush that crashed after the swap leaves this key behind; the next flush applies it first.
+FLUSHING_KEY = "polls:views:flushing"
+# Field of the flushing hash holding its batch number.
+BATCH_FIELD = "batch"
+FLUSH_WATERMARK = "flush_view_counts"
+LOCK_KEY = "polls:views:flush-lock"
+LOCK_MS = 5 * 60 * 1000
+
+# Release the flush lock only if it is still ours. KEYS[1]: lock; ARGV[1]: token
+_UNLOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def record(events: Iterable[dict]) -> None:
+    """
+    Count view events (dicts with poll_id, author_id, device_id, weight) in one round trip.
+    Counters add each view's sampling weight; reach sees every view, sampled out or not,
+    since a PFADD costs no storage.
+    """
+    events = [e for e in events if e.get("kind") == "view"]
+    if not events:
+        return
+    r = get_redis()
+    if r is None:
+        return
+    views: Dict[int, int] = {}
+    for e in events:
+        views[e["poll_id"]] = views.get(e["poll_id"], 0) + e.get("weight", 1)
+    try:
+        pipe = r.pipeline(transaction=False)
+        for poll_id, n in views.items():
+            if n:
+                pipe.hincrby(PENDING_KEY, poll_id, n)
+        reach.queue_record(pipe, events)
+        pipe.execute()
+    except Exception:
+        logger.warning("view counters: increment failed for %d polls", len(views))
+
+
+def _add_views(model, deltas: Dict[int, int], now) -> None:
+    """views += delta for each poll's row of `model`, creating missing rows first."""
+    model.objects.bulk_create([model(poll_id=pid) for pid in deltas], ignore_conflicts=True)
+    if connection.vendor != "postgresql":
+        for poll_id, delta in deltas.items():
+            model.objects.filter(poll_id=poll_id).update(views=F("views") + delta, updated_at=now)
+        return
+    table = connection.ops.quote_name(model._meta.db_table)
+    values = ", ".join(["(%s::bigint, %s::bigint)"] * len(deltas))
+    params = [x for item in deltas.items() for x in item]
+    with connection.cursor() as cur:
+        cur.execute(
+            f"UPDATE {table} AS t SET views = t.views + v.delta, updated_at = %s "
+            f"FROM (VALUES {values}) AS v(poll_id, delta) WHERE t.poll_id = v.poll_id",
+            [now, *params],
+        )
+
+
+def flush() -> int:
+    """Move pending view deltas into PollStats.views and PollAgg.views. Returns the number of polls."""
+    r = get_redis()
+    if r is None:
+        return 0
+    token = secrets.token_hex(8)
+    if not r.set(LOCK_KEY, token, nx=True, px=LOCK_MS):
+        # Another flush is running.
+        return 0
+    try:
+        return _flush_locked(r)
+    finally:
+        try:
+            r.eval(_UNLOCK_LUA, 1, LOCK_KEY, token)
+        except Exception:
+            logger.warning("view counters: unlock failed; the lock expires in %d ms", LOCK_MS)
+
+
+def _decode(value) -> str:
+    return value.decode("utf-8") if isinstance(value, (bytes, bytearray)) else value
+
+
+def _flush_locked(r) -> int:
+    if not r.exists(FLUSHING_KEY):
+        try:
+            r.rename(PENDING_KEY, FLUSHING_KEY)
+        except Exception:
+            # No key: no views since the last flush.
+            return 0
+    applied = 0
+    now = timezone.now()
+    with transaction.atomic():
+        AggregationWatermark.objects.get_or_create(name=FLUSH_WATERMARK)
+        mark = AggregationWatermark.objects.select_for_update().get(name=FLUSH_WATERMARK)
+        # A retried hash keeps the number it got first.
+        r.hsetnx(FLUSHING_KEY, BATCH_FIELD, mark.last_event_id + 1)
+        raw = {_decode(k): int(v) for k, v in r.hgetall(FLUSHING_KEY).items()}
+        batch = raw.pop(BATCH_FIELD)
+        if batch <= mark.last_event_id:
+            logger.info("view counters: batch %s was already applied; discarding it", batch)
+        else:
+            deltas = {int(k): v for k, v in raw.items() if v > 0}
+            applied = _apply(deltas, now)
+            mark.last_event_id = batch
+            mark.save(update_fields=["last_event_id", "updated_at"])
+    r.delete(FLUSHING_KEY)
+    return applied
+
+
+def _apply(deltas: Dict[int, int], now) -> int:
+    if not deltas:
+        return 0
+    # Views of polls deleted since they were counted would fail the FK checks at commit
+    # and leave the flushing hash stuck; the row locks keep the rest from being deleted now.
+    alive = set(
+        Poll.objects.select_for_update(no_key=True)
+        .filter(pk__in=list(deltas))
+        .order_by("pk")
+        .values_list("id", flat=True)
+    )
+    gone = [pid for pid in deltas if pid not in alive]
+    if gone:
+        logger.info("view counters: dropping views of %d deleted polls", len(gone))
+        deltas = {pid: n for pid, n in deltas.items() if pid in alive}
+    if deltas:
+        _add_views(PollStats, deltas, now)
+        _add_views(PollAgg, deltas, now)
+        rollups.add_metrics({(pid, "views"): n for pid, n in deltas.items()}, now)
+    return len(deltas)
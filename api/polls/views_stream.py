@@ -4,11 +4,11 @@ import logging
 from typing import Dict
 
 from django.http import StreamingHttpResponse, Http404
-from django.db.models import Count
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
 
-from .models import Poll, Vote
+from .models import Poll
+from . import counters as vote_counters
 from lib.redis.pubsub import get_redis, CHANNEL_FMT
 from lib.renderers.sse import EventStreamRenderer, IgnoreClientNegotiation
 
@@ -36,11 +36,7 @@ def _snapshot(poll_id: int) -> Dict:
     """
     Lightweight vote snapshot used as initial state for the stream.
     """
-    agg = Vote.objects.filter(poll_id=poll_id).values("option_id").annotate(c=Count("id"))
-    counts = {row["option_id"]: row["c"] for row in agg}
-    total = sum(counts.values())
-    perc = {k: round((v / total) * 100, 2) if total else 0.0 for k, v in counts.items()}
-    return {"poll_id": poll_id, "total_votes": total, "counts": counts, "percents": perc}
+    return vote_counters.snapshot(poll_id)
 
 
 class PollStreamView(APIView):
@@ -1,38 +1,88 @@
 from rest_framework.viewsets import GenericViewSet
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework import status as http
 
+from polls import event_buffer, sampling, view_counts
 from polls.serializers import EventInSerializer
-from polls.models import Poll
-from polls.models import Event  # from analytics.py
+from lib.http_helpers.parsers import PlainTextJSONParser
+
+COLLECT_BATCH_MAX = 200
 
 
 class AnalyticsViewSet(GenericViewSet):
     """
     Analytics collection:
-      - POST /analytics/collect  — record a view/dwell/vote/share event
+      - POST /analytics/collect        — record a view/dwell/vote/share event
+      - POST /analytics/collect-batch  — record a list of events (JSON or text/plain beacon), 204
+    Views are counted in Redis (flush_view_counts); other events are buffered in Redis
+    and bulk-inserted by the flush_event_buffer task. View and dwell events may be
+    sampled (EVENT_SAMPLE_RATES, polls/sampling.py).
     """
     permission_classes = [AllowAny]
     authentication_classes = []
 
+    def _record(self, events):
+        """
+        Apply EVENT_SAMPLE_RATES, then send views to the Redis view counters and the
+        kept events of other kinds to the Event buffer.
+        """
+        events = sampling.apply(events)
+        view_counts.record([e for e in events if e["kind"] == "view"])
+        event_buffer.enqueue([e for e in events if e["kind"] != "view" and e["weight"]])
+
     @action(detail=False, methods=["post"], url_path="collect")
     def collect(self, request):
         ser = EventInSerializer(data=request.data)
         ser.is_valid(raise_exception=True)
         d = ser.validated_data
 
-        try:
-            poll = Poll.objects.only("id").get(pk=d["poll_id"])
-        except Poll.DoesNotExist:
+        authors = event_buffer.poll_authors([d["poll_id"]])
+        if d["poll_id"] not in authors:
             return Response({"detail": "poll not found"}, status=http.HTTP_404_NOT_FOUND)
 
-        Event.objects.create(
-            kind=d["kind"],
-            poll=poll,
-            author=request.user if getattr(request, "user", None) and request.user.is_authenticated else None,
-            device_id=d.get("device_id", "") or "",
-            dwell_ms=d.get("dwell_ms", 0) or 0,
-        )
+        self._record([{
+            "kind": d["kind"],
+            "poll_id": d["poll_id"],
+            "author_id": authors[d["poll_id"]],
+            "device_id": d.get("device_id", "") or "",
+            "dwell_ms": d.get("dwell_ms", 0) or 0,
+        }])
         return Response({"ok": True})
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="collect-batch",
+        parser_classes=[JSONParser, PlainTextJSONParser],
+    )
+    def collect_batch(self, request):
+        """
+        body: [{"kind", "poll_id", "dwell_ms"?, "device_id"?}, ...] or {"events": [...]}
+        Invalid events and events of unknown polls are dropped (beacons cannot read errors).
+        """
+        data = request.data
+        items = data.get("events") if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            return Response({"detail": "expected a list of events"}, status=http.HTTP_400_BAD_REQUEST)
+
+        valid = []
+        for item in items[:COLLECT_BATCH_MAX]:
+            ser = EventInSerializer(data=item)
+            if ser.is_valid():
+                valid.append(ser.validated_data)
+        authors = event_buffer.poll_authors(d["poll_id"] for d in valid)
+        self._record([
+            {
+                "kind": d["kind"],
+                "poll_id": d["poll_id"],
+                "author_id": authors[d["poll_id"]],
+                "device_id": d.get("device_id", "") or "",
+                "dwell_ms": d.get("dwell_ms", 0) or 0,
+            }
+            for d in valid
+            if d["poll_id"] in authors
+        ])
+        return Response(status=http.HTTP_204_NO_CONTENT)
@@ -1,22 +1,60 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
-from polls.models import Poll
+from polls import reach
+from polls.analytics_query import QueryError, cached_query
+from polls.models import DwellSketch, Poll, PollStats
 from polls.models import PollAgg  # re-exported from models/analytics
+from lib.stats.ddsketch import DDSketch
 
 class AuthorViewSet(GenericViewSet):
     """
     Author tools:
-      - GET /author/dashboard/
+      - GET /author/dashboard/                           — per-poll views, votes, unique reach, dwell p50/p90/p99
+      - GET /author/dashboard/?from=YYYY-MM-DD&to=...    — reach and dwell percentiles over a UTC date range
+      - GET /author/analytics/                           — metric time series from rollups (see `analytics`)
     """
     permission_classes = [IsAuthenticated]
 
+    ANALYTICS_MAX_POLLS = 100
+    ANALYTICS_DEFAULT_RANGE = {
+        "hour": timedelta(days=3),
+        "day": timedelta(days=30),
+        "week": timedelta(weeks=26),
+        "month": timedelta(days=365),
+    }
+
     @action(detail=False, methods=["get"], url_path="dashboard")
     def dashboard(self, request):
         polls = Poll.objects.filter(author=request.user).values("id", "title")
         ids = [p["id"] for p in polls]
-        aggs = {a["poll_id"]: a for a in PollAgg.objects.filter(poll_id__in=ids).values("poll_id", "views", "votes", "shares", "dwell_ms_avg")}
+        aggs = {a["poll_id"]: a for a in PollAgg.objects.filter(poll_id__in=ids).values("poll_id", "views", "votes", "shares", "dwell_ms_avg", "dwell_sketch")}
+        try:
+            start = parse_date(request.query_params.get("from") or "")
+            end = parse_date(request.query_params.get("to") or "")
+        except ValueError:
+            return Response(
+                {"detail": "`from`/`to` must be valid YYYY-MM-DD dates"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if start or end:
+            reach_by_poll = reach.unique_viewers(ids, start=start, end=end)
+            sketches = {}
+            days = DwellSketch.objects.filter(poll_id__in=ids)
+            if start:
+                days = days.filter(day__gte=start)
+            if end:
+                days = days.filter(day__lte=end)
+            for row in days.values("poll_id", "sketch"):
+                sketches.setdefault(row["poll_id"], DDSketch()).merge(DDSketch.from_dict(row["sketch"]))
+        else:
+            reach_by_poll = dict(PollStats.objects.filter(poll_id__in=ids).values_list("poll_id", "unique_viewers"))
+            sketches = {pid: DDSketch.from_dict(a["dwell_sketch"]) for pid, a in aggs.items()}
         items = []
         for p in polls:
             a = aggs.get(p["id"], {"views": 0, "votes": 0, "shares": 0, "dwell_ms_avg": 0})
@@ -24,6 +62,70 @@ class AuthorViewSet(GenericViewSet):
             items.append({
                 "id": p["id"], "title": p["title"],
                 "views": a["views"], "votes": a["votes"], "shares": a["shares"], "dwell_ms_avg": a["dwell_ms_avg"],
+                "unique_viewers": reach_by_poll.get(p["id"], 0),
+                **self._dwell_percentiles(sketches.get(p["id"])),
                 "ctr": round(ctr, 2),
             })
         return Response({"items": items})
+
+    @action(detail=False, methods=["get"], url_path="analytics")
+    def analytics(self, request):
+        """
+        Time series of the author's polls, answered from rollup tables only:
+          ?poll_ids=1,2 (at most ANALYTICS_MAX_POLLS; default: the most recent ANALYTICS_MAX_POLLS own polls)
+          &metrics=views,votes,shares,dwell_count,dwell_ms_avg (default views,votes)
+          &granularity=hour|day|week|month (default hour)
+          &from=<ISO datetime or date>&to=<ISO datetime or date> (UTC, default: recent window)
+        Returns {"granularity", "from", "to", "series": [{"poll_id", "metric", "points": [[t, v], ...]}]}.
+        """
+        params = request.query_params
+        granularity = params.get("granularity") or "hour"
+        metrics = [m for m in (params.get("metrics") or "views,votes").split(",") if m]
+        try:
+            requested = {int(x) for x in (params.get("poll_ids") or "").split(",") if x}
+            start = self._parse_bound(params.get("from"))
+            end = self._parse_bound(params.get("to"))
+        except ValueError:
+            return Response(
+                {"detail": "`poll_ids` must be integers and `from`/`to` ISO dates"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if len(requested) > self.ANALYTICS_MAX_POLLS:
+            return Response(
+                {"detail": f"At most {self.ANALYTICS_MAX_POLLS} polls per query"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        own = Poll.objects.filter(author=request.user)
+        if requested:
+            own = own.filter(id__in=requested)
+        else:
+            own = own.order_by("-created_at")[: self.ANALYTICS_MAX_POLLS]
+        poll_ids = list(own.values_list("id", flat=True))
+
+        # Round the default end up to the minute so repeated dashboard loads share a cache entry.
+        end = end or timezone.now().replace(second=0, microsecond=0) + timedelta(minutes=1)
+        start = start or end - self.ANALYTICS_DEFAULT_RANGE.get(granularity, timedelta(days=3))
+        try:
+            series = cached_query(request.user.pk, poll_ids, metrics, start, end, granularity)
+        except QueryError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"granularity": granularity, "from": start, "to": end, "series": series})
+
+    def _parse_bound(self, value):
+        """ISO datetime or date (UTC midnight) -> aware datetime; None if empty. Raises ValueError."""
+        if not value:
+            return None
+        dt = parse_datetime(value)
+        if dt is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(value)
+            dt = datetime.combine(day, time.min)
+        return dt if timezone.is_aware(dt) else dt.replace(tzinfo=dt_timezone.utc)
+
+    def _dwell_percentiles(self, sketch):
+        """dwell_ms_p50/p90/p99 from a DDSketch (None without dwell samples)."""
+        out = {}
+        for q in (50, 90, 99):
+            value = sketch.quantile(q / 100) if sketch else None
+            out[f"dwell_ms_p{q}"] = round(value) if value is not None else None
+        return out
@@ -1,7 +1,5 @@
-import time
 import logging
 from django.db.models import Count
-from django.core.cache import cache
 from rest_framework import status as http
 from rest_framework.permissions import AllowAny
 from rest_framework.decorators import action
@@ -11,6 +9,7 @@ from rest_framework.viewsets import GenericViewSet
 from polls.models import Comment
 from polls.serializers import CommentReadSerializer, CommentWriteSerializer
 from lib.http_helpers.pagination import CommentsPagination
+from lib.ratelimit.limiter import RatePolicy
 from lib.utils.network import get_client_ip, sha256_hex
 from polls.permissions import IsModerator
 from lib.redis.pubsub import publish_event
@@ -19,6 +18,7 @@ log = logging.getLogger("polls.comments")
 
 RATE_MIN_PER_IP = 30
 RATE_MIN_PER_DEV = 30
+COMMENT_RATE_POLICY = RatePolicy("comment", ip=(RATE_MIN_PER_IP, 60), dev=(RATE_MIN_PER_DEV, 60))
 
 
 class CommentViewSet(GenericViewSet):
@@ -60,9 +60,7 @@ class CommentViewSet(GenericViewSet):
         device_id = request.headers.get("X-Device-Id") or request.COOKIES.get("did") or ""
         device_hash = sha256_hex(device_id)
 
-        if not self._hit_bucket(f"ip:{ip_hash}", RATE_MIN_PER_IP):
-            return Response({"detail": "Too Many Requests"}, status=http.HTTP_429_TOO_MANY_REQUESTS)
-        if device_hash and not self._hit_bucket(f"dev:{device_hash}", RATE_MIN_PER_DEV):
+        if COMMENT_RATE_POLICY.check(ip=ip_hash, dev=device_hash):
             return Response({"detail": "Too Many Requests"}, status=http.HTTP_429_TOO_MANY_REQUESTS)
 
         # Handle soft-moderation flag from serializer.validate_content
@@ -117,17 +115,3 @@ class CommentViewSet(GenericViewSet):
             return Response({"ok": True, "status": c.status})
 
         return Response({"detail": "invalid action"}, status=http.HTTP_400_BAD_REQUEST)
-
-    # ------- helpers -------
-
-    def _hit_bucket(self, key: str, limit: int) -> bool:
-        bucket = int(time.time() // 60)
-        ck = f"cmrl:{key}:{bucket}"
-        cur = cache.get(ck)
-        if cur is None:
-            cache.add(ck, 1, timeout=60)
-            return True
-        try:
-            return cache.incr(ck) <= limit
-        except Exception:
-            return False
@@ -14,6 +14,7 @@ from rest_framework import status as http
 
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from polls import voters
 from polls.models import MagicLinkToken, Vote
 from lib.utils.network import sha256_hex
 from lib.auth.cookies import set_access_cookie, set_refresh_cookie
@@ -71,6 +72,11 @@ def migrate_device_votes_to_user(user, device_id=None) -> int:
                     continue
                 v.user = user
                 v.save(update_fields=["user"])
+                transaction.on_commit(
+                    lambda poll_id=v.poll_id, option_id=v.option_id: voters.remember_vote(
+                        poll_id, option_id, user_id=user.pk
+                    )
+                )
                 migrated += 1
             return migrated
     except Exception:
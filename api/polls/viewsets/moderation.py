@@ -1,9 +1,11 @@
 from django.db import transaction
-from rest_framework import throttling, permissions, status as http
+from rest_framework import permissions, status as http
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet, ReadOnlyModelViewSet
 
+from lib.ratelimit.limiter import RatePolicy
+from lib.ratelimit.throttling import PolicyThrottle
 from polls.models import Poll, Report
 from polls.permissions import IsModerator
 from polls.serializers import (
@@ -14,12 +16,11 @@ from polls.serializers import (
 )
 
 
-class ReportAnonRateThrottle(throttling.AnonRateThrottle):
-    rate = "5/min"
+REPORT_RATE_POLICY = RatePolicy("report", anon=(5, 60), user=(10, 60))
 
 
-class ReportUserRateThrottle(throttling.UserRateThrottle):
-    rate = "10/min"
+class ReportRateThrottle(PolicyThrottle):
+    policy = REPORT_RATE_POLICY
 
 
 class ReportViewSet(ReadOnlyModelViewSet):
@@ -38,7 +39,7 @@ class ReportViewSet(ReadOnlyModelViewSet):
 
     def get_throttles(self):
         if self.action == "create":
-            return [ReportAnonRateThrottle(), ReportUserRateThrottle()]
+            return [ReportRateThrottle()]
         return super().get_throttles()
 
     def create(self, request, *args, **kwargs):
@@ -1,16 +1,9 @@
 from __future__ import annotations
 
 import logging
-import time
-from typing import Dict
-
-from django.db import transaction, IntegrityError
-from django.db.models import (
-    Q, F, Value, Case, When, FloatField, Exists, OuterRef, ExpressionWrapper,
-)
-from django.db.models.functions import Coalesce, Ln, Exp, Now, Extract, Cast
-from django.utils import timezone
-from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Value, Case, When, FloatField, Exists, OuterRef
+from django.utils.dateparse import parse_datetime
 
 from rest_framework import status as http
 from rest_framework.decorators import action
@@ -18,27 +11,31 @@ from rest_framework.permissions import AllowAny, IsAuthenticated, IsAuthenticate
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
-from polls.models import Poll, PollOption, Vote, VisibilityMode, PollTopic, FollowTopic, FollowAuthor
-from lib.http_helpers.pagination import FeedCursorPagination
+from polls import feeds, interests, ranking, timelines, rollups as vote_rollups
+from polls.models import Poll, PollTopic, VoteRollup
+from lib.http_helpers.pagination import FeedCursorPagination, FollowingCursorPagination
 from polls.serializers import (
     PollBaseSerializer,
     PollDetailSerializer,
     PollWriteSerializer,
 )
 from polls.permissions import IsAuthorOrReadOnly
-from lib.redis.pubsub import publish_poll_update
+from polls.guards import get_guard
+from polls.voting import cast_vote, cast_vote_batch, OptionNotInPoll
+from polls.tasks import fan_out_poll
+from lib.ratelimit.limiter import RatePolicy
 from lib.utils.network import get_client_ip, sha256_hex
 
 logger = logging.getLogger(__name__)
 
-# ranking weights
-W_TREND = 0.6
-W_FRESH = 0.4
+# ranking weight of followed topics/authors (trend and freshness: polls/ranking.py)
 W_INTEREST = 0.5
 
 # vote limits
 RATE_LIMIT_IP_PER_MIN = 60
 RATE_LIMIT_DEV_PER_MIN = 60
+VOTE_RATE_POLICY = RatePolicy("vote", ip=(RATE_LIMIT_IP_PER_MIN, 60), dev=(RATE_LIMIT_DEV_PER_MIN, 60))
+VOTE_BATCH_MAX = 50
 COOKIE_DEVICE_KEY = "did"
 COOKIE_MAX_AGE = 60 * 60 * 24 * 365  # 1 year
 
@@ -48,21 +45,24 @@ class PollViewSet(ModelViewSet):
     Endpoints for polls:
 
     - GET    /polls/                — ranked feed (public)
+    - GET    /polls/following/      — newest polls of followed authors (authenticated)
     - GET    /polls/{id}/           — details (public)
     - POST   /polls/                — create (author = request.user)
     - PATCH  /polls/{id}/           — update (owner or moderator)
     - DELETE /polls/{id}/           — delete (owner or moderator)
     - POST   /polls/{id}/vote/      — cast a vote (public, rate-limited)
+    - POST   /polls/vote-batch/     — cast several votes in one request (public, rate-limited)
+    - GET    /polls/{id}/timeline/  — votes per minute/hour/day bucket (public, when results are visible)
     """
     queryset = Poll.objects.select_related("stats", "author").prefetch_related("options", "polltopic_set__topic")
     pagination_class = FeedCursorPagination
 
     def get_permissions(self):
-        if self.action in ("create",):
+        if self.action in ("create", "following"):
             return [IsAuthenticated()]
         if self.action in ("update", "partial_update", "destroy"):
             return [IsAuthenticated(), IsAuthorOrReadOnly()]
-        if self.action == "vote":
+        if self.action in ("vote", "vote_batch"):
             return [AllowAny()]
         return [AllowAny()]  # list/retrieve
 
@@ -76,43 +76,36 @@ class PollViewSet(ModelViewSet):
     def list(self, request, *args, **kwargs):
         """
         Ranked feed of public polls with optional filters (?topic_id=..., ?author_id=...).
+        Trend and freshness come from the materialized Poll.rank_score (polls/ranking.py);
+        only the per-user interest boost is computed here. Anonymous hot and topic feeds are
+        read from Redis sorted sets (polls/feeds.py) when available.
         """
         user = request.user if getattr(request, "user", None) and request.user.is_authenticated else None
 
-        qs = (
-            Poll.objects.select_related("stats")
-            .prefetch_related("options", "polltopic_set__topic")
-            .filter(visibility=VisibilityMode.PUBLIC)
-            .annotate(total_votes=Coalesce(F("stats__total_votes"), Value(0)))
-        )
-
-        # Age (hours) = (now - created_at) / 3600
-        age_seconds = Extract(Now() - F("created_at"), "epoch")
-        age_hours = ExpressionWrapper(age_seconds / Value(3600.0), output_field=FloatField())
+        qs = feeds.feed_polls().select_related("stats").prefetch_related("options", "polltopic_set__topic")
 
-        fresh = Exp(-age_hours / Value(24.0))  # exp(-age/24)
-        trend = Ln(Value(1.0) + Cast(F("total_votes"), FloatField()))  # ln(1 + votes)
-
-        if user:
-            # topic match: any topic followed by the user?
-            pt_subq = PollTopic.objects.filter(
-                poll_id=OuterRef("pk"),
-                topic_id__in=FollowTopic.objects.filter(user=user).values("topic_id"),
-            )
-            has_topic_match = Exists(pt_subq)
-
-            # author match: author followed by the user?
-            has_author_match = Exists(FollowAuthor.objects.filter(user=user, author_id=OuterRef("author_id")))
-
-            interest = (
-                Case(When(has_author_match, then=Value(1.0)), default=Value(0.0), output_field=FloatField())
-                + Case(When(has_topic_match, then=Value(1.0)), default=Value(0.0), output_field=FloatField())
-            )
-        else:
+        followed = interests.get_interests(user.pk) if user else None
+        personalized = bool(followed and (followed.author_ids or followed.topic_ids))
+        if personalized:
+            # Followed ids come from the interests cache and are inlined as literal IN lists.
             interest = Value(0.0)
-
-        score = W_TREND * trend + W_FRESH * fresh + W_INTEREST * interest
-        qs = qs.annotate(score=score)
+            if followed.author_ids:
+                interest = interest + Case(
+                    When(author_id__in=followed.author_ids, then=Value(1.0)),
+                    default=Value(0.0),
+                    output_field=FloatField(),
+                )
+            if followed.topic_ids:
+                has_topic_match = Exists(
+                    PollTopic.objects.filter(poll_id=OuterRef("pk"), topic_id__in=followed.topic_ids)
+                )
+                interest = interest + Case(
+                    When(has_topic_match, then=Value(1.0)), default=Value(0.0), output_field=FloatField()
+                )
+            qs = qs.annotate(score=F("rank_score") + W_INTEREST * interest)
+        else:
+            # Anonymous (or no follows): an index range scan on poll_vis_rank_idx.
+            qs = qs.annotate(score=F("rank_score"))
 
         # Optional filters
         topic_id = request.query_params.get("topic_id")
@@ -122,15 +115,67 @@ class PollViewSet(ModelViewSet):
         if author_id:
             qs = qs.filter(author_id=author_id)
 
-        qs = qs.order_by("-score", "-created_at", "-id")
-        page = self.paginate_queryset(qs)
-        ser = PollBaseSerializer(page, many=True, context={"request": request})
+        # FeedCursorPagination orders by (-score, -created_at, -id), freezes the order of a session
+        # and seeks past the cursor key beyond it.
+        feed_key = self._feed_key(topic_id) if not personalized and not author_id else None
+        if feed_key is None:
+            page = self.paginate_queryset(qs)
+        else:
+            paginator = self.paginator
+
+            def fetch(position, snapshot, limit):
+                rows = feeds.fetch(feed_key, qs, position, snapshot, limit)
+                return rows if rows is not None else paginator.fetch_queryset(qs, position, snapshot, limit)
+
+            page = paginator.paginate_keyset(
+                fetch,
+                request,
+                queryset=qs,
+                list_keys=lambda snapshot, limit: feeds.session_keys(feed_key, limit),
+            )
+        ser = PollBaseSerializer(page, many=True, context=self._page_context(request, page))
         return self.get_paginated_response(ser.data)
 
+    def _feed_key(self, topic_id):
+        """Redis feed of an unpersonalized list request (hot, or one topic); None if not applicable."""
+        if not topic_id:
+            return feeds.GLOBAL_KEY
+        try:
+            return feeds.topic_key(int(topic_id))
+        except (TypeError, ValueError):
+            return None
+
+    def _page_context(self, request, page):
+        """Serializer context for a page of polls, with the viewer's votes resolved in one lookup."""
+        return {"request": request, "user_votes": PollBaseSerializer.user_votes_for(request, page)}
+
+    @action(detail=False, methods=["get"], url_path="following")
+    def following(self, request):
+        """
+        Newest polls of the authors the user follows, from the fan-out timeline
+        (polls/timelines.py), with SQL as the fallback.
+        """
+        author_ids = interests.get_interests(request.user.pk).author_ids
+        qs = feeds.feed_polls().select_related("stats").prefetch_related("options", "polltopic_set__topic")
+        qs = qs.filter(author_id__in=author_ids)
+        paginator = FollowingCursorPagination()
+
+        def fetch(position, snapshot, limit):
+            if not author_ids:
+                return []
+            rows = timelines.fetch(request.user.pk, author_ids, qs, position, snapshot, limit)
+            return rows if rows is not None else paginator.fetch_queryset(qs, position, snapshot, limit)
+
+        page = paginator.paginate_keyset(fetch, request)
+        ser = PollBaseSerializer(page, many=True, context=self._page_context(request, page))
+        return paginator.get_paginated_response(ser.data)
+
     # ---------- Write (create/update/destroy) ----------
 
     def perform_create(self, serializer: PollWriteSerializer):
-        serializer.save(author=self.request.user)
+        poll = serializer.save(author=self.request.user)
+        ranking.refresh([poll.pk])
+        transaction.on_commit(lambda: fan_out_poll.delay(poll.pk))
 
     # ---------- Vote (action) ----------
 
@@ -149,25 +194,153 @@ class PollViewSet(ModelViewSet):
         Returns fresh aggregated counts/percents and sets a client device cookie if needed.
         """
         try:
-            poll = Poll.objects.select_related("stats").get(pk=int(pk))
-        except (Poll.DoesNotExist, ValueError, TypeError):
+            guard = get_guard(int(pk))
+        except (ValueError, TypeError):
+            guard = None
+        if guard is None:
             return Response({"detail": "Poll not found"}, status=http.HTTP_404_NOT_FOUND)
 
         option_id = (request.data or {}).get("option_id")
         if not option_id:
             return Response({"detail": "`option_id` is required"}, status=http.HTTP_400_BAD_REQUEST)
-
         try:
-            option = PollOption.objects.get(pk=int(option_id), poll=poll)
-        except (PollOption.DoesNotExist, ValueError, TypeError):
+            option_id = int(option_id)
+        except (ValueError, TypeError):
+            option_id = None
+        if option_id not in guard.option_ids:
             return Response({"detail": "Option does not belong to this poll"}, status=http.HTTP_400_BAD_REQUEST)
 
         # Active check
-        now = timezone.now()
-        if poll.is_hidden or poll.is_frozen or (poll.closes_at and now >= poll.closes_at):
+        if not guard.is_open():
             return Response({"detail": "Poll is closed or unavailable"}, status=http.HTTP_403_FORBIDDEN)
 
-        # Identity
+        user, ip_hash, device_id, device_hash, set_cookie_device = self._voter_identity(request)
+        limited = self._check_vote_rate(ip_hash, device_hash)
+        if limited is not None:
+            return limited
+
+        idem = (request.headers.get("Idempotency-Key") or "")[:64]
+        try:
+            payload = cast_vote(
+                guard.id,
+                option_id,
+                user=user,
+                ip_hash=ip_hash or None,
+                device_hash=device_hash or None,
+                idempotency_key=idem or None,
+            )
+        except OptionNotInPoll:
+            return Response({"detail": "Option does not belong to this poll"}, status=http.HTTP_400_BAD_REQUEST)
+        return self._vote_response(payload, set_cookie_device=set_cookie_device, device_id=device_id)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        permission_classes=[AllowAny],
+        authentication_classes=[],
+        url_path="vote-batch",
+    )
+    def vote_batch(self, request):
+        """
+        Cast several votes in one request (feed clients flushing queued swipes):
+          body: {"votes": [{"poll_id": <int>, "option_id": <int>, "idempotency_key": <str>?}, ...]}
+        Each vote counts against the same rate limits as a single vote. Returns
+        {"results": [...]} in request order: a vote payload per accepted item, or
+        {"poll_id", "status", "detail"} for an item that was rejected.
+        """
+        data = request.data
+        votes = data.get("votes") if isinstance(data, dict) else data
+        if not isinstance(votes, list) or not votes:
+            return Response({"detail": "`votes` must be a non-empty list"}, status=http.HTTP_400_BAD_REQUEST)
+        if len(votes) > VOTE_BATCH_MAX:
+            return Response(
+                {"detail": f"At most {VOTE_BATCH_MAX} votes per batch"}, status=http.HTTP_400_BAD_REQUEST
+            )
+
+        user, ip_hash, device_id, device_hash, set_cookie_device = self._voter_identity(request)
+        limited = self._check_vote_rate(ip_hash, device_hash, cost=len(votes))
+        if limited is not None:
+            return limited
+
+        results: list = [None] * len(votes)
+        accepted = []  # (index, poll_id, option_id, idempotency_key)
+        for index, item in enumerate(votes):
+            item = item if isinstance(item, dict) else {}
+            try:
+                poll_id = int(item.get("poll_id"))
+                guard = get_guard(poll_id)
+            except (ValueError, TypeError):
+                poll_id, guard = item.get("poll_id"), None
+            if guard is None:
+                results[index] = {"poll_id": poll_id, "status": http.HTTP_404_NOT_FOUND, "detail": "Poll not found"}
+                continue
+            try:
+                option_id = int(item.get("option_id"))
+            except (ValueError, TypeError):
+                option_id = None
+            if option_id not in guard.option_ids:
+                results[index] = {
+                    "poll_id": poll_id,
+                    "status": http.HTTP_400_BAD_REQUEST,
+                    "detail": "Option does not belong to this poll",
+                }
+                continue
+            if not guard.is_open():
+                results[index] = {
+                    "poll_id": poll_id,
+                    "status": http.HTTP_403_FORBIDDEN,
+                    "detail": "Poll is closed or unavailable",
+                }
+                continue
+            idem = str(item.get("idempotency_key") or "")[:64]
+            accepted.append((index, poll_id, option_id, idem or None))
+
+        if accepted:
+            payloads = cast_vote_batch(
+                [(poll_id, option_id, idem) for _, poll_id, option_id, idem in accepted],
+                user=user,
+                ip_hash=ip_hash or None,
+                device_hash=device_hash or None,
+            )
+            for (index, *_), payload in zip(accepted, payloads):
+                results[index] = payload
+
+        return self._vote_response({"results": results}, set_cookie_device=set_cookie_device, device_id=device_id)
+
+    # ---------- Timeline (action) ----------
+
+    @action(detail=True, methods=["get"], permission_classes=[AllowAny], url_path="timeline")
+    def timeline(self, request, pk=None):
+        """
+        Vote counts over time from the VoteRollup table:
+          ?granularity=minute|hour|day (default hour)&from=<ISO datetime>&to=<ISO datetime>
+        Returns {"poll_id", "granularity", "buckets": [{"t", "total", "counts"}]}.
+        """
+        poll = self.get_object()
+        if not PollBaseSerializer(context={"request": request}).get_results_available(poll):
+            return Response({"detail": "Results are not available yet"}, status=http.HTTP_403_FORBIDDEN)
+
+        granularity = request.query_params.get("granularity") or VoteRollup.Granularity.HOUR
+        if granularity not in VoteRollup.Granularity.values:
+            return Response(
+                {"detail": f"`granularity` must be one of {', '.join(VoteRollup.Granularity.values)}"},
+                status=http.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            start = parse_datetime(request.query_params.get("from") or "")
+            end = parse_datetime(request.query_params.get("to") or "")
+        except ValueError:
+            start = end = None
+        if (request.query_params.get("from") and not start) or (request.query_params.get("to") and not end):
+            return Response({"detail": "`from`/`to` must be ISO datetimes"}, status=http.HTTP_400_BAD_REQUEST)
+
+        buckets = vote_rollups.timeline(poll.pk, granularity, start=start, end=end)
+        return Response({"poll_id": poll.pk, "granularity": granularity, "buckets": buckets})
+
+    # ---------- Helpers ----------
+
+    def _voter_identity(self, request):
+        """Return (user, ip_hash, device_id, device_hash, set_cookie_device) for a vote request."""
         user = request.user if getattr(request, "user", None) and request.user.is_authenticated else None
         ip = get_client_ip(request)
         ip_hash = sha256_hex(ip) if ip else None
@@ -178,134 +351,18 @@ class PollViewSet(ModelViewSet):
             import secrets
             device_id = secrets.token_urlsafe(16)
             set_cookie_device = True
-        device_hash = sha256_hex(device_id)
+        return user, ip_hash, device_id, sha256_hex(device_id), set_cookie_device
 
-        # Rate limits
-        if ip_hash and not self._rate_limit(f"ip:{ip_hash}", RATE_LIMIT_IP_PER_MIN):
+    def _check_vote_rate(self, ip_hash, device_hash, cost: int = 1):
+        """Apply vote rate limits (ip and device in one round trip); returns a 429 response or None."""
+        exceeded = VOTE_RATE_POLICY.check(cost=cost, ip=ip_hash, dev=device_hash)
+        if exceeded == "ip":
             return Response({"detail": "Too many requests from this IP"}, status=http.HTTP_429_TOO_MANY_REQUESTS)
-        if device_hash and not self._rate_limit(f"dev:{device_hash}", RATE_LIMIT_DEV_PER_MIN):
+        if exceeded == "dev":
             return Response({"detail": "Too many requests from this device"}, status=http.HTTP_429_TOO_MANY_REQUESTS)
+        return None
 
-        # Idempotency
-        idem = (request.headers.get("Idempotency-Key") or "")[:64]
-        if idem:
-            existing_by_idem = Vote.objects.filter(idempotency_key=idem, poll=poll).only("option_id").first()
-            if existing_by_idem:
-                return self._response_with_stats(
-                    poll,
-                    existing_by_idem.option_id,
-                    already_voted=True,
-                    idempotent=True,
-                    set_cookie_device=set_cookie_device,
-                    device_id=device_id,
-                )
-
-        # Already voted? (by user/device/ip)
-        q = Vote.objects.filter(poll=poll)
-        cond = Q()
-        if user:
-            cond |= Q(user=user)
-        if device_hash:
-            cond |= Q(device_hash=device_hash)
-        if ip_hash:
-            cond |= Q(ip_hash=ip_hash)
-        existing = q.filter(cond).only("option_id").first() if cond.children else None
-        if existing:
-            return self._response_with_stats(
-                poll,
-                existing.option_id,
-                already_voted=True,
-                idempotent=False,
-                set_cookie_device=set_cookie_device,
-                device_id=device_id,
-            )
-
-        # Create vote (handle races/constraints)
-        try:
-            with transaction.atomic():
-                Vote.objects.create(
-                    poll=poll,
-                    option=option,
-                    user=user,
-                    ip_hash=ip_hash or None,
-                    device_hash=device_hash or None,
-                    idempotency_key=idem or None,
-                )
-        except IntegrityError:
-            # Unique constraint hit — treat as "already voted"
-            return self._response_with_stats(
-                poll,
-                option.id,
-                already_voted=True,
-                idempotent=bool(idem),
-                set_cookie_device=set_cookie_device,
-                device_id=device_id,
-            )
-
-        # Success
-        return self._response_with_stats(
-            poll,
-            option.id,
-            already_voted=False,
-            idempotent=bool(idem),
-            set_cookie_device=set_cookie_device,
-            device_id=device_id,
-        )
-
-    # ---------- Helpers ----------
-
-    def _rate_limit(self, key: str, limit: int, window_seconds: int = 60) -> bool:
-        bucket = int(time.time() // window_seconds)
-        cache_key = f"rl:{key}:{bucket}"
-        current = cache.get(cache_key)
-        if current is None:
-            added = cache.add(cache_key, 1, timeout=window_seconds)
-            if not added:
-                try:
-                    current = cache.incr(cache_key)
-                except Exception:
-                    return False
-                return current <= limit
-            return True
-        try:
-            current = cache.incr(cache_key)
-        except Exception:
-            return False
-        return current <= limit
-
-    def _response_with_stats(
-        self,
-        poll: Poll,
-        chosen_option_id: int,
-        *,
-        already_voted: bool,
-        idempotent: bool,
-        set_cookie_device: bool,
-        device_id: str,
-    ) -> Response:
-        from django.db.models import Count
-
-        agg = Vote.objects.filter(poll=poll).values("option_id").annotate(c=Count("id"))
-        counts: Dict[int, int] = {row["option_id"]: row["c"] for row in agg}
-        total = sum(counts.values()) or 0
-        percents = {opt_id: round((count / total) * 100, 2) if total else 0.0 for opt_id, count in counts.items()}
-
-        payload = {
-            "poll_id": poll.id,
-            "voted_option_id": int(chosen_option_id),
-            "already_voted": bool(already_voted),
-            "idempotent": bool(idempotent),
-            "total_votes": int(total),
-            "counts": counts,
-            "percents": percents,
-        }
-
-        if not already_voted:
-            try:
-                publish_poll_update(poll.id, payload)
-            except Exception:
-                logger.exception("publish_poll_update failed for poll_id=%s", poll.id)
-
+    def _vote_response(self, payload: dict, *, set_cookie_device: bool, device_id: str) -> Response:
         resp = Response(payload, status=http.HTTP_200_OK)
         if set_cookie_device and device_id:
             resp.set_cookie(COOKIE_DEVICE_KEY, device_id, max_age=COOKIE_MAX_AGE, httponly=False, samesite="Lax")
@@ -353,6 +410,7 @@ class PollViewSet(ModelViewSet):
         """Create a comment for a poll"""
         from polls.models import Comment
         from polls.serializers import CommentWriteSerializer, CommentReadSerializer
+        from polls.viewsets.comment import COMMENT_RATE_POLICY
         from lib.redis.pubsub import publish_event
 
         serializer = CommentWriteSerializer(data=request.data, context={"request": request})
@@ -364,9 +422,7 @@ class PollViewSet(ModelViewSet):
         ip_hash = sha256_hex(ip) if ip else None
 
         # Rate limiting
-        if ip_hash and not self._rate_limit(f"ip:{ip_hash}", 30):
-            return Response({"detail": "Too Many Requests"}, status=http.HTTP_429_TOO_MANY_REQUESTS)
-        if device_hash and not self._rate_limit(f"dev:{device_hash}", 30):
+        if COMMENT_RATE_POLICY.check(ip=ip_hash, dev=device_hash):
             return Response({"detail": "Too Many Requests"}, status=http.HTTP_429_TOO_MANY_REQUESTS)
 
         # Handle soft-moderation flag from serializer.validate_content
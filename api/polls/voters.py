@@ -0,0 +1,207 @@
+# polls/voters.py
+"""
+Per-poll voter registry in Redis.
+
+One hash per poll, `polls:voters:{poll_id}`, maps identity fields to the chosen
+option id:
+
+    u:<user_id>  d:<device_hash>  i:<ip_hash>  k:<idempotency_key>
+
+A value of "0" records that the identity is known not to have voted. Fields are
+written when a vote commits and filled lazily from the Vote table on a miss, so
+"has this viewer voted?" is answered without SQL once an identity has been seen.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+from lib.redis.pubsub import get_redis
+
+logger = logging.getLogger(__name__)
+
+VOTERS_KEY_FMT = "polls:voters:{poll_id}"
+# The whole hash expires so negative entries do not pile up forever; it refills lazily.
+VOTERS_TTL = 60 * 60 * 24
+NOT_VOTED = 0
+
+# Claim identity fields for a vote unless one of them already has one.
+# KEYS[1]: registry hash; ARGV: option_id, ttl, field...
+# Returns the existing option id, or false after writing the claim.
+_CLAIM_LUA = """
+for i = 3, #ARGV do
+  local v = redis.call('HGET', KEYS[1], ARGV[i])
+  if v and v ~= '0' then return v end
+end
+for i = 3, #ARGV do
+  redis.call('HSET', KEYS[1], ARGV[i], ARGV[1])
+end
+if redis.call('TTL', KEYS[1]) < 0 then
+  redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return false
+"""
+
+_claim_script = None
+
+
+class RegistryUnavailable(Exception):
+    """Redis could not be reached; callers fall back to SQL."""
+
+
+def voters_key(poll_id: int) -> str:
+    return VOTERS_KEY_FMT.format(poll_id=poll_id)
+
+
+def identity_fields(
+    *,
+    user_id=None,
+    device_hash: Optional[str] = None,
+    ip_hash: Optional[str] = None,
+    idempotency_key: Optional[str] = None,
+) -> Dict[str, str]:
+    """Return {kind: field} for the identities that are present."""
+    fields = {}
+    if idempotency_key:
+        fields["k"] = f"k:{idempotency_key}"
+    if user_id:
+        fields["u"] = f"u:{user_id}"
+    if device_hash:
+        fields["d"] = f"d:{device_hash}"
+    if ip_hash:
+        fields["i"] = f"i:{ip_hash}"
+    return fields
+
+
+def _interpret(kinds, values) -> Tuple[Optional[int], Optional[str], bool]:
+    complete = True
+    for kind, value in zip(kinds, values):
+        if value is None:
+            complete = False
+            continue
+        option_id = int(value)
+        if option_id != NOT_VOTED:
+            return option_id, kind, True
+    return None, None, complete
+
+
+def lookup(poll_id: int, fields: Dict[str, str]) -> Tuple[Optional[int], Optional[str], bool]:
+    """
+    Look identity fields up in one HMGET.
+
+    Returns (option_id, kind, complete): the option voted by the first matching identity
+    (idempotency key first) and its kind, and whether every field had a known value — when
+    `complete` is True and option_id is None, none of the identities has voted.
+    Raises RegistryUnavailable if Redis fails.
+    """
+    return lookup_many({poll_id: fields})[poll_id]
+
+
+def lookup_many(requests: Dict[int, Dict[str, str]]) -> Dict[int, Tuple[Optional[int], Optional[str], bool]]:
+    """`lookup` for several polls in one pipelined round trip: {poll_id: fields} -> {poll_id: result}."""
+    results = {pid: (None, None, True) for pid, fields in requests.items() if not fields}
+    pending = [(pid, list(fields), fields) for pid, fields in requests.items() if fields]
+    if not pending:
+        return results
+    r = get_redis()
+    if r is None:
+        raise RegistryUnavailable()
+    try:
+        pipe = r.pipeline(transaction=False)
+        for pid, kinds, fields in pending:
+            pipe.hmget(voters_key(pid), [fields[k] for k in kinds])
+        replies = pipe.execute()
+    except Exception as exc:
+        raise RegistryUnavailable() from exc
+    for (pid, kinds, _), values in zip(pending, replies):
+        results[pid] = _interpret(kinds, values)
+    return results
+
+
+def remember(poll_id: int, values: Dict[str, int]) -> None:
+    """Store {field: option_id or NOT_VOTED}; failures are logged and ignored."""
+    if not values:
+        return
+    r = get_redis()
+    if r is None:
+        return
+    key = voters_key(poll_id)
+    try:
+        pipe = r.pipeline(transaction=False)
+        pipe.hset(key, mapping=values)
+        pipe.expire(key, VOTERS_TTL, nx=True)
+        pipe.execute()
+    except Exception:
+        logger.warning("voter registry: write failed for poll_id=%s", poll_id)
+
+
+def remember_vote(poll_id: int, option_id: int, *, user_id=None, device_hash=None, ip_hash=None, idempotency_key=None) -> None:
+    """Record the identities of a committed (or accepted) vote."""
+    fields = identity_fields(
+        user_id=user_id, device_hash=device_hash, ip_hash=ip_hash, idempotency_key=idempotency_key
+    )
+    remember(poll_id, {f: option_id for f in fields.values()})
+
+
+def remember_not_voted(poll_id: int, fields: Iterable[str]) -> None:
+    """
+    Record identities that have not voted. Uses HSETNX so a vote recorded concurrently
+    (after our SQL read) is never overwritten by this stale negative answer.
+    """
+    fields = list(fields)
+    r = get_redis()
+    if r is None or not fields:
+        return
+    key = voters_key(poll_id)
+    try:
+        pipe = r.pipeline(transaction=False)
+        for field in fields:
+            pipe.hsetnx(key, field, NOT_VOTED)
+        pipe.expire(key, VOTERS_TTL, nx=True)
+        pipe.execute()
+    except Exception:
+        logger.warning("voter registry: write failed for poll_id=%s", poll_id)
+
+
+def forget(poll_id: int, fields: Iterable[str]) -> None:
+    """Drop identity fields so the next lookup refills them from the Vote table."""
+    fields = list(fields)
+    r = get_redis()
+    if r is None or not fields:
+        return
+    try:
+        r.hdel(voters_key(poll_id), *fields)
+    except Exception:
+        logger.warning("voter registry: hdel failed for poll_id=%s", poll_id)
+
+
+def invalidate(poll_id: int) -> None:
+    r = get_redis()
+    if r is None:
+        return
+    try:
+        r.delete(voters_key(poll_id))
+    except Exception:
+        logger.warning("voter registry: invalidate failed for poll_id=%s", poll_id)
+
+
+def claim(poll_id: int, option_id: int, fields: Iterable[str]) -> Optional[int]:
+    """
+    Atomically claim identity fields for a vote that is not in the Vote table yet
+    (write-behind ingestion). Returns the option of an existing vote instead, if any.
+    Raises RegistryUnavailable if Redis fails.
+    """
+    global _claim_script
+    fields = list(fields)
+    if not fields:
+        return None
+    r = get_redis()
+    if r is None:
+        raise RegistryUnavailable()
+    try:
+        if _claim_script is None:
+            _claim_script = r.register_script(_CLAIM_LUA)
+        existing = _claim_script(keys=[voters_key(poll_id)], args=[option_id, VOTERS_TTL, *fields])
+    except Exception as exc:
+        raise RegistryUnavailable() from exc
+    return int(existing) if existing is not None else None
@@ -0,0 +1,720 @@
+# polls/voting.py
+"""
+Vote commit pipeline shared by every vote writer.
+
+One call does the dedup lookups, inserts the vote, bumps PollStats, and after
+the transaction commits updates the Redis counters and publishes exactly one
+SSE update. The returned payload is what the vote endpoints send back.
+
+With VOTE_INGEST_MODE = "stream" accepted votes are appended to a Redis Stream
+instead (write-behind) and persisted in batches by `drain_vote_stream`.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+import socket
+from collections import Counter
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction, IntegrityError
+from django.db.models import Q
+from django.utils import timezone
+
+from polls import counters as vote_counters
+from polls import guards, voters
+from polls.models import PollOption, PollStats, Vote
+from lib.redis.pubsub import get_redis, publish_poll_update
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+
+def build_payload(poll_id: int, chosen_option_id: int, *, already_voted: bool, idempotent: bool) -> dict:
+    """Vote response payload with fresh counts/percents from the counter store."""
+    counts, total = vote_counters.get_counts(poll_id)
+    return {
+        "poll_id": poll_id,
+        "voted_option_id": int(chosen_option_id),
+        "already_voted": bool(already_voted),
+        "idempotent": bool(idempotent),
+        "total_votes": int(total),
+        "counts": counts,
+        "percents": vote_counters.percents_for(counts, total),
+    }
+
+
+def _identity_fields(user=None, ip_hash=None, device_hash=None, idempotency_key=None) -> dict:
+    return voters.identity_fields(
+        user_id=user.pk if user else None,
+        device_hash=device_hash,
+        ip_hash=ip_hash,
+        idempotency_key=idempotency_key,
+    )
+
+
+def _shard_key(fields: dict) -> Optional[str]:
+    """Voter identity that picks the PollStats shard (see POLL_STATS_SHARDS)."""
+    return fields.get("d") or fields.get("u") or fields.get("i")
+
+
+def _remember_row(poll_id: int, row) -> None:
+    voters.remember_vote(
+        poll_id,
+        row.option_id,
+        user_id=row.user_id,
+        device_hash=row.device_hash,
+        ip_hash=row.ip_hash,
+        idempotency_key=row.idempotency_key,
+    )
+
+
+def _find_existing_vote_db(poll_id: int, *, user=None, ip_hash=None, device_hash=None, idempotency_key=None):
+    fields = ("option_id", "user_id", "device_hash", "ip_hash", "idempotency_key")
+    if idempotency_key:
+        existing = Vote.objects.filter(idempotency_key=idempotency_key, poll_id=poll_id).only(*fields).first()
+        if existing:
+            return existing
+
+    cond = Q()
+    if user:
+        cond |= Q(user=user)
+    if device_hash:
+        cond |= Q(device_hash=device_hash)
+    if ip_hash:
+        cond |= Q(ip_hash=ip_hash)
+    if not cond.children:
+        return None
+    return Vote.objects.filter(poll_id=poll_id).filter(cond).only(*fields).first()
+
+
+def find_existing_vote(
+    poll_id: int,
+    *,
+    user=None,
+    ip_hash: Optional[str] = None,
+    device_hash: Optional[str] = None,
+    idempotency_key: Optional[str] = None,
+) -> tuple[Optional[int], bool]:
+    """
+    Return (option_id, idempotent) of a vote already cast by this identity, or (None, False).
+
+    Answered by the voter registry when it knows the identities; otherwise by the Vote
+    table, and the answer is written back to the registry.
+    """
+    fields = _identity_fields(user=user, ip_hash=ip_hash, device_hash=device_hash, idempotency_key=idempotency_key)
+    try:
+        option_id, kind, complete = voters.lookup(poll_id, fields)
+        if option_id is not None:
+            return option_id, kind == "k"
+        if complete:
+            return None, False
+    except voters.RegistryUnavailable:
+        fields = {}
+
+    existing = _find_existing_vote_db(
+        poll_id, user=user, ip_hash=ip_hash, device_hash=device_hash, idempotency_key=idempotency_key
+    )
+    if existing is None:
+        voters.remember_not_voted(poll_id, fields.values())
+        return None, False
+    _remember_row(poll_id, existing)
+    return existing.option_id, bool(idempotency_key) and existing.idempotency_key == idempotency_key
+
+
+def find_user_vote(poll_id: int, *, user=None, device_hash: Optional[str] = None) -> Optional[int]:
+    """Option id voted by the viewer (user account or device), if any."""
+    option_id, _ = find_existing_vote(poll_id, user=user, device_hash=device_hash)
+    return option_id
+
+
+def find_user_votes(poll_ids: Iterable[int], *, user=None, device_hash: Optional[str] = None) -> dict:
+    """
+    {poll_id: option_id} of the polls the viewer voted on, for a page of polls. Misses are not
+    written back as "not voted": a feed page would add a field to the hash of every poll it shows.
+    """
+    items = {pid: None for pid in poll_ids}
+    if not items or not (user or device_hash):
+        return {}
+    existing = _find_existing_votes_bulk(items, user=user, device_hash=device_hash, remember_misses=False)
+    return {pid: option_id for pid, (option_id, _) in existing.items()}
+
+
+def _after_commit(poll_id: int, option_id: int, fields: dict) -> None:
+    voters.remember(poll_id, {f: option_id for f in fields.values()})
+    vote_counters.incr(poll_id, option_id)
+    try:
+        publish_poll_update(poll_id, vote_counters.snapshot(poll_id))
+    except Exception:
+        logger.exception("publish_poll_update failed for poll_id=%s", poll_id)
+
+
+class OptionNotInPoll(Exception):
+    """The option does not exist or belongs to another poll."""
+
+
+def _check_option(poll_id: int, option_id: int) -> None:
+    guard = guards.get_guard(poll_id)
+    if guard is None or option_id not in guard.option_ids:
+        raise OptionNotInPoll(option_id)
+
+
+def commit_vote(
+    poll_id: int,
+    option_id: int,
+    *,
+    user=None,
+    ip_hash: Optional[str] = None,
+    device_hash: Optional[str] = None,
+    idempotency_key: Optional[str] = None,
+) -> dict:
+    """
+    Record a vote and return the response payload.
+
+    Existing votes (by idempotency key or user/device/ip) are reported as `already_voted`
+    without writing anything. Raises OptionNotInPoll for a foreign option. Must be called
+    outside an atomic block so that the payload counts include the new vote.
+    """
+    if connection.vendor == "postgresql":
+        return _commit_vote_pg(
+            poll_id, option_id, user=user, ip_hash=ip_hash, device_hash=device_hash, idempotency_key=idempotency_key
+        )
+
+    _check_option(poll_id, option_id)
+    idem = idempotency_key or None
+    existing_option_id, idempotent = find_existing_vote(
+        poll_id, user=user, ip_hash=ip_hash, device_hash=device_hash, idempotency_key=idem
+    )
+    if existing_option_id is not None:
+        return build_payload(poll_id, existing_option_id, already_voted=True, idempotent=idempotent)
+
+    try:
+        with transaction.atomic():
+            Vote.objects.create(
+                poll_id=poll_id,
+                option_id=option_id,
+                user=user,
+                ip_hash=ip_hash or None,
+                device_hash=device_hash or None,
+                idempotency_key=idem,
+            )
+            fields = _identity_fields(user=user, ip_hash=ip_hash, device_hash=device_hash, idempotency_key=idem)
+            PollStats.apply_vote(poll_id, option_id, 1, shard_key=_shard_key(fields))
+            transaction.on_commit(lambda: _after_commit(poll_id, option_id, fields))
+    except IntegrityError:
+        # Unique constraint hit — treat as "already voted"
+        return build_payload(poll_id, option_id, already_voted=True, idempotent=bool(idem))
+
+    return build_payload(poll_id, option_id, already_voted=False, idempotent=bool(idem))
+
+
+def _find_existing_votes_bulk(items: dict, *, user=None, ip_hash=None, device_hash=None, remember_misses=True) -> dict:
+    """
+    Bulk `find_existing_vote` for one voter across several polls.
+    `items` is {poll_id: idempotency_key}; returns {poll_id: (option_id, idempotent)} for polls
+    already voted. One pipelined registry round trip plus at most one Vote query.
+    Misses are written back as "not voted" unless `remember_misses` is False.
+    """
+    requests = {
+        pid: _identity_fields(user=user, ip_hash=ip_hash, device_hash=device_hash, idempotency_key=idem)
+        for pid, idem in items.items()
+    }
+    existing = {}
+    try:
+        looked_up = voters.lookup_many(requests)
+        unknown = []
+        for pid, (option_id, kind, complete) in looked_up.items():
+            if option_id is not None:
+                existing[pid] = (option_id, kind == "k")
+            elif not complete:
+                unknown.append(pid)
+    except voters.RegistryUnavailable:
+        unknown, requests = list(items), {}
+    if not unknown:
+        return existing
+
+    cond = Q()
+    if user:
+        cond |= Q(user=user)
+    if device_hash:
+        cond |= Q(device_hash=device_hash)
+    if ip_hash:
+        cond |= Q(ip_hash=ip_hash)
+    keys = [items[pid] for pid in unknown if items[pid]]
+    if keys:
+        cond |= Q(idempotency_key__in=keys)
+    found = {}
+    if cond.children:
+        rows = Vote.objects.filter(poll_id__in=unknown).filter(cond).only(
+            "poll_id", "option_id", "user_id", "device_hash", "ip_hash", "idempotency_key"
+        )
+        for row in rows:
+            idem_match = bool(items[row.poll_id]) and row.idempotency_key == items[row.poll_id]
+            if row.poll_id not in found or idem_match:
+                found[row.poll_id] = (row, idem_match)
+    for pid in unknown:
+        if pid in found:
+            row, idem_match = found[pid]
+            _remember_row(pid, row)
+            existing[pid] = (row.option_id, idem_match)
+        elif remember_misses:
+            voters.remember_not_voted(pid, requests.get(pid, {}).values())
+    return existing
+
+
+def _insert_votes(rows: list) -> list[tuple[int, int]]:
+    """
+    Insert Vote rows, skipping those that hit one of the unique constraints, and return
+    (poll_id, option_id) of the rows this call inserted. PostgreSQL: one INSERT ... ON CONFLICT
+    DO NOTHING RETURNING; elsewhere one savepoint per row. Must run inside a transaction.
+    """
+    if not rows:
+        return []
+    if connection.vendor != "postgresql":
+        inserted = []
+        for v in rows:
+            try:
+                with transaction.atomic():
+                    v.save(force_insert=True)
+            except IntegrityError:
+                continue
+            inserted.append((v.poll_id, v.option_id))
+        return inserted
+    now = timezone.now()
+    values = ", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(rows))
+    params = [
+        x
+        for v in rows
+        for x in (v.poll_id, v.option_id, v.user_id, v.ip_hash, v.device_hash, v.idempotency_key, now)
+    ]
+    with connection.cursor() as cur:
+        cur.execute(
+            f"INSERT INTO {connection.ops.quote_name(Vote._meta.db_table)} "
+            "(poll_id, option_id, user_id, ip_hash, device_hash, idempotency_key, created_at) "
+            f"VALUES {values} ON CONFLICT DO NOTHING RETURNING poll_id, option_id",
+            params,
+        )
+        return [tuple(row) for row in cur.fetchall()]
+
+
+def commit_vote_batch(
+    items: list[tuple[int, int, Optional[str]]],
+    *,
+    user=None,
+    ip_hash: Optional[str] = None,
+    device_hash: Optional[str] = None,
+) -> list[dict]:
+    """
+    Record several votes of one voter (feed swipes, offline replay queues) and return one
+    payload per item, in order.
+
+    Items are (poll_id, option_id, idempotency_key) for options already validated against
+    their polls. Dedup runs in bulk and all new votes go in with one INSERT ... ON CONFLICT
+    DO NOTHING RETURNING (see _insert_votes); a repeated poll in the same batch reports the
+    first item's vote.
+    """
+    first: dict[int, tuple[int, Optional[str]]] = {}
+    for poll_id, option_id, idem in items:
+        first.setdefault(poll_id, (option_id, idem or None))
+
+    outcomes = {
+        pid: (option_id, True, idempotent)
+        for pid, (option_id, idempotent) in _find_existing_votes_bulk(
+            {pid: idem for pid, (_, idem) in first.items()}, user=user, ip_hash=ip_hash, device_hash=device_hash
+        ).items()
+    }
+
+    to_insert = {pid: (option_id, idem) for pid, (option_id, idem) in first.items() if pid not in outcomes}
+    if to_insert:
+        with transaction.atomic():
+            inserted = dict(
+                _insert_votes(
+                    [
+                        Vote(
+                            poll_id=pid,
+                            option_id=option_id,
+                            user=user,
+                            ip_hash=ip_hash or None,
+                            device_hash=device_hash or None,
+                            idempotency_key=idem,
+                        )
+                        for pid, (option_id, idem) in to_insert.items()
+                    ]
+                )
+            )
+            for pid, option_id in inserted.items():
+                fields = _identity_fields(
+                    user=user, ip_hash=ip_hash, device_hash=device_hash, idempotency_key=to_insert[pid][1]
+                )
+                PollStats.apply_vote(pid, option_id, 1, shard_key=_shard_key(fields))
+                transaction.on_commit(lambda pid=pid, option_id=option_id, fields=fields: _after_commit(pid, option_id, fields))
+
+        for pid, (option_id, idem) in to_insert.items():
+            if pid in inserted:
+                outcomes[pid] = (option_id, False, bool(idem))
+            else:
+                # Lost a race with a concurrent vote of the same identity.
+                existing_option_id, idempotent = find_existing_vote(
+                    pid, user=user, ip_hash=ip_hash, device_hash=device_hash, idempotency_key=idem
+                )
+                outcomes[pid] = (existing_option_id or option_id, True, idempotent or bool(idem))
+
+    payloads = {
+        pid: build_payload(pid, option_id, already_voted=already_voted, idempotent=idempotent)
+        for pid, (option_id, already_voted, idempotent) in outcomes.items()
+    }
+    results = []
+    seen = set()
+    for poll_id, _, _ in items:
+        payload = payloads[poll_id]
+        if poll_id in seen:
+            payload = {**payload, "already_voted": True}
+        seen.add(poll_id)
+        results.append(payload)
+    return results
+
+
+# One statement: validate the option, look up a prior vote by idempotency key or identity,
+# and insert only if there is none. ON CONFLICT (any of the partial unique constraints)
+# absorbs races with concurrent writers instead of raising IntegrityError.
+_PG_VOTE_SQL = """
+WITH opt AS (
+    SELECT id FROM {option_table} WHERE id = %(option_id)s AND poll_id = %(poll_id)s
+),
+prior AS (
+    SELECT option_id, user_id, device_hash, ip_hash, idempotency_key,
+           (%(idem)s::text IS NOT NULL AND idempotency_key IS NOT DISTINCT FROM %(idem)s::text) AS idem_match
+    FROM {vote_table}
+    WHERE poll_id = %(poll_id)s
+      AND (idempotency_key = %(idem)s::text OR user_id = %(user_id)s::bigint
+           OR device_hash = %(device_hash)s::text OR ip_hash = %(ip_hash)s::text)
+    ORDER BY idem_match DESC
+    LIMIT 1
+),
+ins AS (
+    INSERT INTO {vote_table} (poll_id, option_id, user_id, ip_hash, device_hash, idempotency_key, created_at)
+    SELECT %(poll_id)s, opt.id, %(user_id)s::bigint, %(ip_hash)s::text, %(device_hash)s::text, %(idem)s::text, %(now)s
+    FROM opt
+    WHERE NOT EXISTS (SELECT 1 FROM prior)
+    ON CONFLICT DO NOTHING
+    RETURNING option_id
+)
+SELECT
+    EXISTS (SELECT 1 FROM opt),
+    (SELECT option_id FROM ins),
+    COALESCE(prior.idem_match, false),
+    prior.option_id, prior.user_id, prior.device_hash, prior.ip_hash, prior.idempotency_key
+FROM (SELECT 1) AS one LEFT JOIN prior ON true
+"""
+
+
+def _commit_vote_pg(
+    poll_id: int,
+    option_id: int,
+    *,
+    user=None,
+    ip_hash: Optional[str] = None,
+    device_hash: Optional[str] = None,
+    idempotency_key: Optional[str] = None,
+) -> dict:
+    """
+    PostgreSQL fast path: one INSERT ... ON CONFLICT DO NOTHING RETURNING statement replaces
+    the option fetch, the idempotency and identity lookups and the savepoint around the insert.
+    """
+    idem = idempotency_key or None
+    fields = _identity_fields(user=user, ip_hash=ip_hash, device_hash=device_hash, idempotency_key=idem)
+    try:
+        known_option_id, kind, _ = voters.lookup(poll_id, fields)
+        if known_option_id is not None:
+            return build_payload(poll_id, known_option_id, already_voted=True, idempotent=kind == "k")
+    except voters.RegistryUnavailable:
+        pass
+
+    sql = _PG_VOTE_SQL.format(option_table=PollOption._meta.db_table, vote_table=Vote._meta.db_table)
+    params = {
+        "poll_id": poll_id,
+        "option_id": int(option_id),
+        "user_id": user.pk if user else None,
+        "ip_hash": ip_hash or None,
+        "device_hash": device_hash or None,
+        "idem": idem,
+        "now": timezone.now(),
+    }
+    with transaction.atomic():
+        with connection.cursor() as cur:
+            cur.execute(sql, params)
+            option_ok, inserted_option_id, prior_idem, *prior = cur.fetchone()
+        if not option_ok:
+            raise OptionNotInPoll(option_id)
+        if inserted_option_id is not None:
+            PollStats.apply_vote(poll_id, inserted_option_id, 1, shard_key=_shard_key(fields))
+            transaction.on_commit(lambda: _after_commit(poll_id, inserted_option_id, fields))
+
+    if inserted_option_id is not None:
+        return build_payload(poll_id, inserted_option_id, already_voted=False, idempotent=bool(idem))
+    prior_option_id, prior_user_id, prior_device_hash, prior_ip_hash, prior_idem_key = prior
+    if prior_option_id is not None:
+        voters.remember_vote(
+            poll_id,
+            prior_option_id,
+            user_id=prior_user_id,
+            device_hash=prior_device_hash,
+            ip_hash=prior_ip_hash,
+            idempotency_key=prior_idem_key,
+        )
+        return build_payload(poll_id, prior_option_id, already_voted=True, idempotent=prior_idem)
+
+    # Conflict with a vote committed after the statement snapshot: fetch it (second round trip).
+    existing_option_id, idempotent = find_existing_vote(
+        poll_id, user=user, ip_hash=ip_hash, device_hash=device_hash, idempotency_key=idem
+    )
+    return build_payload(
+        poll_id, existing_option_id or option_id, already_voted=True, idempotent=idempotent or bool(idem)
+    )
+
+
+# --- Write-behind ingestion ---------------------------------------------------
+
+INGEST_STREAM = "polls:votes:ingest"
+INGEST_GROUP = "vote-writers"
+# Entries left unacknowledged this long (crashed consumer) are claimed by the next drain.
+CLAIM_IDLE_MS = 60_000
+# Entries that can no longer be stored (poll, option or user deleted) are moved here.
+DEAD_LETTER_STREAM = "polls:votes:dead"
+DEAD_LETTER_MAXLEN = 10_000
+# Consumers of restarted workers are removed once idle this long with nothing pending.
+CONSUMER_IDLE_MS = 60 * 60 * 1000
+
+
+def ingest_mode() -> str:
+    return getattr(settings, "VOTE_INGEST_MODE", "sync")
+
+
+def cast_vote(poll_id: int, option_id: int, **identity) -> dict:
+    """Record a vote using the configured ingestion mode ("sync" or "stream")."""
+    if ingest_mode() == "stream":
+        payload = enqueue_vote(poll_id, option_id, **identity)
+        if payload is not None:
+            return payload
+    return commit_vote(poll_id, option_id, **identity)
+
+
+def cast_vote_batch(items: list[tuple[int, int, Optional[str]]], **identity) -> list[dict]:
+    """
+    Record several votes of one voter using the configured ingestion mode; see commit_vote_batch.
+    In "stream" mode each item is enqueued like a single vote, and items that cannot be
+    enqueued (Redis unavailable) go through commit_vote_batch together.
+    """
+    if ingest_mode() != "stream":
+        return commit_vote_batch(items, **identity)
+    payloads = [
+        enqueue_vote(poll_id, option_id, idempotency_key=idem, **identity)
+        for poll_id, option_id, idem in items
+    ]
+    fallback = [i for i, payload in enumerate(payloads) if payload is None]
+    if fallback:
+        for i, payload in zip(fallback, commit_vote_batch([items[i] for i in fallback], **identity)):
+            payloads[i] = payload
+    return payloads
+
+
+def enqueue_vote(
+    poll_id: int,
+    option_id: int,
+    *,
+    user=None,
+    ip_hash: Optional[str] = None,
+    device_hash: Optional[str] = None,
+    idempotency_key: Optional[str] = None,
+) -> Optional[dict]:
+    """
+    Accept a vote without touching the Vote table and append it to the ingest stream.
+
+    Dedup is checked synchronously: the voter registry (or the Vote table) for persisted
+    votes, then an atomic registry claim that also covers votes still in the stream.
+    Returns None when Redis is unavailable (caller falls back to the synchronous path).
+    """
+    r = get_redis()
+    if r is None:
+        return None
+
+    _check_option(poll_id, option_id)
+    idem = idempotency_key or None
+    existing_option_id, idempotent = find_existing_vote(
+        poll_id, user=user, ip_hash=ip_hash, device_hash=device_hash, idempotency_key=idem
+    )
+    if existing_option_id is not None:
+        return build_payload(poll_id, existing_option_id, already_voted=True, idempotent=idempotent)
+
+    fields = _identity_fields(user=user, ip_hash=ip_hash, device_hash=device_hash, idempotency_key=idem)
+    try:
+        pending = voters.claim(poll_id, option_id, fields.values())
+    except voters.RegistryUnavailable:
+        logger.warning("vote ingest: registry unavailable for poll_id=%s; using sync path", poll_id)
+        return None
+    if pending is not None:
+        return build_payload(poll_id, pending, already_voted=True, idempotent=False)
+
+    try:
+        r.xadd(INGEST_STREAM, {
+            "poll_id": poll_id,
+            "option_id": option_id,
+            "user_id": user.pk if user else "",
+            "ip_hash": ip_hash or "",
+            "device_hash": device_hash or "",
+            "idempotency_key": idem or "",
+        })
+    except Exception:
+        logger.exception("vote ingest: enqueue failed for poll_id=%s; using sync path", poll_id)
+        voters.forget(poll_id, fields.values())
+        return None
+
+    # Make sure the counter hash exists so the increment is not dropped before the drain persists it.
+    vote_counters.get_counts(poll_id)
+    _after_commit(poll_id, option_id, fields)
+    return build_payload(poll_id, option_id, already_voted=False, idempotent=bool(idempotency_key))
+
+
+def _decode_entry(fields: dict) -> dict:
+    return {
+        (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+        for k, v in fields.items()
+    }
+
+
+def persist_vote_batch(entries: list[dict]) -> int:
+    """
+    Insert queued votes with one INSERT ... ON CONFLICT DO NOTHING RETURNING (_insert_votes).
+    The partial unique constraints on Vote decide which rows survive; PollStats is bumped
+    for the rows this call inserted only, so an entry redelivered after its batch committed
+    (claimed again before the XACK) is not counted twice. Redis counters of polls that lost
+    rows are dropped for a rebuild.
+    Entries whose option (or poll, or user) no longer exists, e.g. options replaced by a
+    poll edit, are moved to DEAD_LETTER_STREAM instead of failing the batch.
+    Returns the number of inserted rows.
+    """
+    if not entries:
+        return 0
+    rows = [
+        Vote(
+            poll_id=int(e["poll_id"]),
+            option_id=int(e["option_id"]),
+            user_id=int(e["user_id"]) if e.get("user_id") else None,
+            ip_hash=e.get("ip_hash") or None,
+            device_hash=e.get("device_hash") or None,
+            idempotency_key=_client_key(e.get("idempotency_key")),
+        )
+        for e in entries
+    ]
+    accepted = Counter((v.poll_id, v.option_id) for v in rows)
+
+    with transaction.atomic():
+        # Lock the referenced rows so they cannot be deleted before the deferred FK checks run.
+        options = set(
+            PollOption.objects.select_for_update(no_key=True)
+            .filter(id__in={v.option_id for v in rows})
+            .order_by("id")
+            .values_list("poll_id", "id")
+        )
+        user_ids = {v.user_id for v in rows if v.user_id}
+        if user_ids:
+            user_ids = set(
+                User.objects.select_for_update(no_key=True)
+                .filter(pk__in=user_ids)
+                .order_by("pk")
+                .values_list("pk", flat=True)
+            )
+        kept, dead = [], []
+        for v, e in zip(rows, entries):
+            if (v.poll_id, v.option_id) in options and (v.user_id is None or v.user_id in user_ids):
+                kept.append(v)
+            else:
+                dead.append(e)
+        inserted = Counter(_insert_votes(kept))
+        for (poll_id, option_id), n in inserted.items():
+            PollStats.apply_vote(poll_id, option_id, n)
+
+    for poll_id in {p for (p, o), n in accepted.items() if inserted.get((p, o), 0) < n}:
+        vote_counters.invalidate(poll_id)
+        voters.invalidate(poll_id)
+    if dead:
+        _dead_letter(dead)
+    return sum(inserted.values())
+
+
+def _client_key(key: Optional[str]) -> Optional[str]:
+    """Idempotency key to store for a queued vote; internal keys of older entries are dropped."""
+    if not key or re.fullmatch(r"ingest:[0-9a-f]{32}", key):
+        return None
+    return key
+
+
+def _dead_letter(entries: list[dict]) -> None:
+    logger.warning("vote ingest: %d queued votes reference deleted rows; dead-lettered", len(entries))
+    r = get_redis()
+    if r is None:
+        return
+    try:
+        pipe = r.pipeline(transaction=False)
+        for e in entries:
+            pipe.xadd(DEAD_LETTER_STREAM, e, maxlen=DEAD_LETTER_MAXLEN, approximate=True)
+        pipe.execute()
+    except Exception:
+        logger.warning("vote ingest: dead-letter write failed")
+
+
+def _consumer_name() -> str:
+    """Stable per worker process, so runs reuse one consumer instead of adding one each."""
+    return f"drain-{socket.gethostname()}-{os.getpid()}"
+
+
+def _prune_consumers(r, current: str) -> None:
+    """Delete consumers of gone workers: idle for CONSUMER_IDLE_MS with nothing pending."""
+    try:
+        for info in r.xinfo_consumers(INGEST_STREAM, INGEST_GROUP):
+            name = info["name"].decode() if isinstance(info["name"], bytes) else info["name"]
+            if name != current and not info["pending"] and info["idle"] > CONSUMER_IDLE_MS:
+                r.xgroup_delconsumer(INGEST_STREAM, INGEST_GROUP, name)
+    except Exception:
+        logger.warning("vote ingest: consumer cleanup failed")
+
+
+def drain_vote_stream(batch_size: Optional[int] = None, max_batches: int = 20) -> int:
+    """
+    Consume the ingest stream in batches of VOTE_INGEST_BATCH_SIZE and persist them.
+    Entries are acknowledged only after their batch commits; entries of a crashed consumer
+    are reclaimed after CLAIM_IDLE_MS. Returns the number of inserted votes.
+    """
+    r = get_redis()
+    if r is None:
+        return 0
+    batch_size = batch_size or getattr(settings, "VOTE_INGEST_BATCH_SIZE", 500)
+    consumer = _consumer_name()
+    try:
+        r.xgroup_create(INGEST_STREAM, INGEST_GROUP, id="0", mkstream=True)
+    except Exception:
+        pass  # group already exists
+    _prune_consumers(r, consumer)
+
+    inserted = 0
+    for _ in range(max_batches):
+        _, claimed, *_ = r.xautoclaim(
+            INGEST_STREAM, INGEST_GROUP, consumer, min_idle_time=CLAIM_IDLE_MS, start_id="0-0", count=batch_size
+        )
+        messages = list(claimed or [])
+        if len(messages) < batch_size:
+            for _stream, items in r.xreadgroup(
+                INGEST_GROUP, consumer, {INGEST_STREAM: ">"}, count=batch_size - len(messages)
+            ) or []:
+                messages.extend(items)
+        messages = [(mid, fields) for mid, fields in messages if fields]
+        if not messages:
+            break
+        inserted += persist_vote_batch([_decode_entry(fields) for _, fields in messages])
+        ids = [mid for mid, _ in messages]
+        r.xack(INGEST_STREAM, INGEST_GROUP, *ids)
+        r.xdel(INGEST_STREAM, *ids)
+    return inserted